@@ -1,34 +1,103 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort
+from flask import Flask, Blueprint, Response, current_app, render_template, request, redirect, url_for, flash, jsonify, abort, stream_with_context, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from werkzeug.security import check_password_hash
 from functools import wraps
-from models import db, User, Produto, Material, Pedra, Tamanho, Pedido, ItemPedido, Avaliacao, Favorito
+from sqlalchemy.exc import OperationalError
+from models import db, User, Produto, Pedido, Avaliacao, Favorito, ResumoAvaliacao, Tarefa
+from models import pedidos_do_usuario, pedidos_com_usuario, pedido_detalhado, STATUS_PEDIDO
 from forms import LoginForm, CadastroForm, PersonalizacaoForm, AvaliacaoForm
 from config import Config
-from datetime import datetime
+from banco import criar_tabelas, semear_dados_iniciais, migrar
+from catalogo import catalogo
+from precos import reais, formatar_reais
+import carrinho as carrinhos
+import busca
+from checkout import finalizar_pedido, pedido_por_chave, CheckoutError
+from paginacao import paginar
+from cache_resposta import cache_resposta
+from metricas import metricas
+from identidade import identidades
+from senhas import senhas, SenhasSobrecarregadas
+from avaliacoes import registrar_avaliacao, resumos_por_produto, reconstruir_resumos
+import tarefas
+from vendas import ajustar_por_consulta, reconstruir_vendas, painel
+from gestao_pedidos import filtros_pedidos, exportar_csv, exportar_ndjson, atualizar_status_em_lote
+import notificacoes
+from assets import assets
+from conexoes import conexoes, somente_leitura
+import limitador
+import imagens
+from datetime import datetime, timedelta
+import click
 from decimal import Decimal
+import uuid
 
-app = Flask(__name__)
-app.config.from_object(Config)
-
-db.init_app(app)
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'loja.login'
 login_manager.login_message = 'Por favor, faça login para acessar esta página.'
 login_manager.login_message_category = 'info'
 
-limiter = Limiter(
-    app=app,
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
+limiter = Limiter(key_func=get_remote_address)
+
+bp = Blueprint('loja', __name__, cli_group=None)
+
+def create_app(config=Config):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    
+    conexoes.init_app(app)
+    db.init_app(app)
+    conexoes.configurar_engines(app, db)
+    login_manager.init_app(app)
+    limitador.init_app(app)
+    limiter.init_app(app)
+    catalogo.init_app(app)
+    carrinhos.init_app(app)
+    busca.init_app(app)
+    cache_resposta.init_app(app)
+    cache_resposta.registrar_versao('catalogo', catalogo.versao)
+    metricas.init_app(app)
+    identidades.init_app(app)
+    senhas.init_app(app)
+    assets.init_app(app)
+    
+    app.register_blueprint(bp)
+    return app
+
+def aquecer(app):
+    """Carrega os caches do catálogo antes de atender requisições.
+
+    Com `gunicorn --preload` isso roda uma vez no processo mestre e os workers
+    já nascem com os caches prontos.
+    """
+    with app.app_context():
+        try:
+            catalogo.materiais()
+        except OperationalError:
+            app.logger.warning('Banco não inicializado; rode "flask init-db" antes de servir a aplicação.')
+        finally:
+            db.session.remove()
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identidades.carregar(int(user_id))
+
+@bp.app_template_global()
+def url_pagina(**parametros):
+    args = request.args.to_dict()
+    args.update(parametros)
+    args = {chave: valor for chave, valor in args.items() if valor is not None}
+    return url_for(request.endpoint, **request.view_args, **args)
+
+@bp.app_template_global()
+def imagem_produto(produto, perfil):
+    return imagens.imagem_produto(produto, perfil)
+
+@bp.app_errorhandler(SenhasSobrecarregadas)
+def senhas_sobrecarregadas(erro):
+    return 'Muitos acessos no momento. Tente novamente em instantes.', 503, {'Retry-After': '1'}
 
 def admin_required(f):
     @wraps(f)
@@ -36,110 +105,188 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_admin:
             flash('Acesso negado. Você precisa ser administrador.', 'error')
-            return redirect(url_for('index'))
+            return redirect(url_for('loja.index'))
         return f(*args, **kwargs)
     return decorated_function
 
-def init_db():
-    with app.app_context():
-        db.create_all()
-        
-        if not Produto.query.first():
-            produto = Produto(
-                nome="Anel Solitário Lume",
-                descricao="Um anel que captura a essência da luz e da elegância. Cada detalhe foi cuidadosamente pensado para transmitir sofisticação e significado único. O brilho do diamante central reflete não apenas a luz, mas também os sentimentos mais profundos.",
-                preco_base=Decimal('2999.00'),
-                imagem_url="/static/imgs/logo.png",
-                ativo=True
-            )
-            db.session.add(produto)
-            
-            materiais = [
-                Material(nome="Ouro 18k", preco_adicional=Decimal('500.00')),
-                Material(nome="Ouro 14k", preco_adicional=Decimal('300.00')),
-                Material(nome="Prata 925", preco_adicional=Decimal('0.00'))
-            ]
-            for material in materiais:
-                db.session.add(material)
-            
-            pedras = [
-                Pedra(nome="Diamante", preco_adicional=Decimal('1000.00')),
-                Pedra(nome="Rubi", preco_adicional=Decimal('600.00')),
-                Pedra(nome="Safira", preco_adicional=Decimal('600.00')),
-                Pedra(nome="Esmeralda", preco_adicional=Decimal('500.00'))
-            ]
-            for pedra in pedras:
-                db.session.add(pedra)
-            
-            tamanhos = [Tamanho(tamanho=str(i)) for i in range(10, 21)]
-            for tamanho in tamanhos:
-                db.session.add(tamanho)
-            
-            if not User.query.filter_by(email="admin@lume.com").first():
-                admin = User(
-                    nome="Administrador",
-                    email="admin@lume.com",
-                    is_admin=True
-                )
-                admin.set_password("admin123")
-                db.session.add(admin)
-            
-            db.session.commit()
-
-init_db()
-
-@app.route('/')
+@bp.cli.command('init-db')
+def init_db_command():
+    criar_tabelas()
+    semear_dados_iniciais()
+    catalogo.invalidar()
+    print('Banco de dados inicializado.')
+
+@bp.cli.command('migrar')
+def migrar_command():
+    alteracoes = migrar()
+    for alteracao in alteracoes:
+        print(f'+ {alteracao}')
+    print('Esquema atualizado.' if alteracoes else 'Esquema já está atualizado.')
+
+@bp.cli.command('limpar-cache-respostas')
+def limpar_cache_respostas_command():
+    cache_resposta.limpar()
+    print('Cache de respostas limpo.')
+
+@bp.cli.command('limpar-carrinhos')
+@click.option('--dias', type=int, default=None, help='Idade mínima, em dias (padrão: CARRINHO_RETENCAO_DIAS).')
+def limpar_carrinhos_command(dias):
+    total = carrinhos.limpar_abandonados(dias if dias is not None else current_app.config['CARRINHO_RETENCAO_DIAS'])
+    print(f'{total} carrinho(s) abandonado(s) removido(s).')
+
+@bp.cli.command('reconstruir-avaliacoes')
+def reconstruir_avaliacoes_command():
+    total = reconstruir_resumos()
+    print(f'Resumos de avaliação reconstruídos para {total} produto(s).')
+
+@bp.cli.command('reconstruir-busca')
+def reconstruir_busca_command():
+    indice = busca.backend_atual()
+    indice.criar_indice()
+    total = indice.reconstruir()
+    db.session.commit()
+    print(f'Índice de busca reconstruído com {total} produto(s).')
+
+@bp.cli.command('reconstruir-vendas')
+def reconstruir_vendas_command():
+    total = reconstruir_vendas()
+    print(f'Rollups de vendas reconstruídos para {total} dia(s).')
+
+@bp.cli.command('vendorizar-assets')
+def vendorizar_assets_command():
+    for caminho in assets.vendorizar():
+        print(f'+ {caminho}')
+    print('Dependências de front-end baixadas; rode "flask construir-assets".')
+
+@bp.cli.command('construir-assets')
+def construir_assets_command():
+    arquivos = assets.construir()
+    for origem, destino in arquivos:
+        print(f'{origem} -> dist/{destino}')
+    for pacote in ('css/lume.css', 'js/lume.js'):
+        if not assets.construido(pacote):
+            print(f'Aviso: {pacote} não foi gerado; o base.html continua usando o CDN.')
+
+@bp.cli.command('gerar-imagens')
+@click.option('--todos', is_flag=True, help='Regera também os produtos que já têm variantes.')
+def gerar_imagens_command(todos):
+    total = imagens.agendar_pendentes(todos)
+    print(f'Geração de imagens enfileirada para {total} produto(s); rode "flask worker" para processar.')
+
+@bp.cli.command('worker')
+@click.option('--lote', type=int, default=None, help='Tarefas reservadas por vez (padrão: TAREFAS_LOTE).')
+@click.option('--intervalo', type=float, default=1.0, help='Segundos de espera com a fila vazia.')
+@click.option('--uma-vez', is_flag=True, help='Processa o que estiver disponível e sai.')
+def worker_command(lote, intervalo, uma_vez):
+    processadas = tarefas.trabalhar(lote, intervalo, uma_vez)
+    print(f'{processadas} tarefa(s) processada(s).')
+
+@bp.route('/')
+@cache_resposta.cachear('catalogo', 'avaliacoes', parametros=('cursor',))
 def index():
-    produtos = Produto.query.filter_by(ativo=True).all()
-    return render_template('index.html', produtos=produtos)
+    pagina = paginar(Produto.query.filter_by(ativo=True), Produto.created_at, Produto.id,
+                     request.args.get('cursor'), current_app.config['ITENS_POR_PAGINA'])
+    resumos = resumos_por_produto([produto.id for produto in pagina.itens])
+    return render_template('index.html', produtos=pagina.itens, proximo_cursor=pagina.proximo_cursor, resumos=resumos)
 
-@app.route('/produto/<int:id>')
+@bp.route('/imagens/<path:caminho>')
+def imagem_derivada(caminho):
+    # O nome traz o hash do conteúdo: o arquivo nunca muda, então pode ficar
+    # no cache do navegador para sempre.
+    resposta = send_from_directory(imagens.diretorio(), caminho, max_age=31536000)
+    resposta.cache_control.public = True
+    resposta.cache_control.immutable = True
+    return resposta
+
+@bp.route('/busca')
+@cache_resposta.cachear('catalogo', 'avaliacoes', parametros=('q', 'preco_min', 'preco_max', 'inicio'))
+def buscar():
+    termo = request.args.get('q', '').strip()
+    limite = current_app.config['ITENS_POR_PAGINA']
+    pagina = busca.backend_atual().pagina(
+        termo,
+        _preco_do_filtro(request.args.get('preco_min')),
+        _preco_do_filtro(request.args.get('preco_max')),
+        max(request.args.get('inicio', 0, type=int), 0),
+        limite
+    )
+    resumos = resumos_por_produto([produto.id for produto in pagina.itens])
+    return render_template('busca.html', termo=termo, produtos=pagina.itens,
+                           proximo_cursor=pagina.proximo_cursor, resumos=resumos)
+
+@bp.route('/busca/sugestoes')
+@cache_resposta.cachear('catalogo', parametros=('q',))
+def sugestoes_busca():
+    termo = request.args.get('q', '').strip()
+    sugestoes = busca.backend_atual().sugerir(termo) if len(termo) >= 2 else []
+    return jsonify({'sugestoes': [{'id': s.id, 'nome': s.nome, 'url': url_for('loja.produto', id=s.id)}
+                                  for s in sugestoes]})
+
+def _preco_do_filtro(valor):
+    try:
+        preco = Decimal(valor)
+    except (TypeError, ArithmeticError):
+        return None
+    return preco if preco.is_finite() and preco >= 0 else None
+
+@bp.route('/produto/<int:id>')
+@cache_resposta.cachear('catalogo', 'avaliacoes-{id}', parametros=('cursor_avaliacoes',))
 def produto(id):
-    produto = Produto.query.get_or_404(id)
-    materiais = Material.query.all()
-    pedras = Pedra.query.all()
-    tamanhos = Tamanho.query.all()
-    avaliacoes = Avaliacao.query.filter_by(produto_id=id).order_by(Avaliacao.created_at.desc()).limit(10).all()
-    
-    form = PersonalizacaoForm()
-    form.tamanho.choices = [(t.tamanho, t.tamanho) for t in tamanhos]
-    form.material.choices = [(m.id, f"{m.nome} (+R$ {m.preco_adicional:.2f})") for m in materiais]
-    form.pedra.choices = [(p.id, f"{p.nome} (+R$ {p.preco_adicional:.2f})") for p in pedras]
+    produto = catalogo.produto(id)
+    if produto is None:
+        abort(404)
+    materiais = catalogo.materiais()
+    pedras = catalogo.pedras()
+    tamanhos = catalogo.tamanhos()
+    pagina_avaliacoes = paginar(Avaliacao.query.filter_by(produto_id=id), Avaliacao.created_at, Avaliacao.id,
+                                request.args.get('cursor_avaliacoes'), 10)
+    resumo_avaliacoes = db.session.get(ResumoAvaliacao, id)
     
+    form = None
     favoritado = False
     if current_user.is_authenticated:
+        form = PersonalizacaoForm()
+        form.tamanho.choices = [(t.tamanho, t.tamanho) for t in tamanhos]
+        form.material.choices = [(m.id, f"{m.nome} (+R$ {m.preco_adicional:.2f})") for m in materiais]
+        form.pedra.choices = [(p.id, f"{p.nome} (+R$ {p.preco_adicional:.2f})") for p in pedras]
+        
         favorito = Favorito.query.filter_by(usuario_id=current_user.id, produto_id=id).first()
         favoritado = favorito is not None
     
     return render_template('produto.html', produto=produto, form=form, 
                          materiais=materiais, pedras=pedras, tamanhos=tamanhos,
-                         avaliacoes=avaliacoes, favoritado=favoritado)
+                         avaliacoes=pagina_avaliacoes.itens, proximo_cursor_avaliacoes=pagina_avaliacoes.proximo_cursor,
+                         resumo_avaliacoes=resumo_avaliacoes,
+                         favoritado=favoritado)
 
-@app.route('/login', methods=['GET', 'POST'])
-@limiter.limit("5 per minute")
+@bp.route('/login', methods=['GET', 'POST'])
+@limiter.limit(limitador.limite_configurado('login'))
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('loja.index'))
     
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         
         if user and user.check_password(form.senha.data):
+            if senhas.precisa_rehash(user.senha_hash):
+                user.set_password(form.senha.data)
+                db.session.commit()
             remember = form.remember_me.data == 'true'
             login_user(user, remember=remember)
             next_page = request.args.get('next')
             flash('Login realizado com sucesso!', 'success')
-            return redirect(next_page) if next_page else redirect(url_for('index'))
+            return redirect(next_page) if next_page else redirect(url_for('loja.index'))
         else:
             flash('Email ou senha incorretos.', 'error')
     
     return render_template('login.html', form=form)
 
-@app.route('/cadastro', methods=['GET', 'POST'])
+@bp.route('/cadastro', methods=['GET', 'POST'])
 def cadastro():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('loja.index'))
     
     form = CadastroForm()
     if form.validate_on_submit():
@@ -153,36 +300,61 @@ def cadastro():
         db.session.add(user)
         db.session.commit()
         flash('Cadastro realizado com sucesso! Faça login para continuar.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('loja.login'))
     
     return render_template('cadastro.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('Logout realizado com sucesso!', 'success')
-    return redirect(url_for('index'))
+    return redirect(url_for('loja.index'))
 
-@app.route('/calcular_preco', methods=['POST'])
+@bp.route('/calcular_preco', methods=['POST'])
 def calcular_preco():
     data = request.get_json()
-    produto_id = data.get('produto_id')
-    material_id = data.get('material_id')
-    pedra_id = data.get('pedra_id')
+    preco = catalogo.preco(data.get('produto_id'), data.get('material_id'), data.get('pedra_id'))
+    
+    if preco is None:
+        return jsonify({'error': 'Dados inválidos'}), 400
+    
+    return jsonify({'preco': float(reais(preco)), 'preco_centavos': preco, 'preco_formatado': formatar_reais(preco)})
+
+@bp.route('/produto/<int:id>/precos', methods=['GET', 'POST'])
+def precos_produto(id):
+    matriz = catalogo.matriz_precos(id)
+    if matriz is None:
+        return jsonify({'error': 'Produto não encontrado'}), 404
     
-    produto = Produto.query.get(produto_id)
-    material = Material.query.get(material_id)
-    pedra = Pedra.query.get(pedra_id)
+    if request.method == 'GET':
+        return jsonify({
+            'produto_id': id,
+            'precos': {f'{material_id}-{pedra_id}': preco for (material_id, pedra_id), preco in matriz.items()}
+        })
     
-    if not all([produto, material, pedra]):
+    data = request.get_json(silent=True) or {}
+    combinacoes = data.get('combinacoes')
+    if not isinstance(combinacoes, list):
         return jsonify({'error': 'Dados inválidos'}), 400
     
-    preco_total = float(produto.preco_base) + float(material.preco_adicional) + float(pedra.preco_adicional)
+    resultado = []
+    for combinacao in combinacoes:
+        if not isinstance(combinacao, dict):
+            return jsonify({'error': 'Dados inválidos'}), 400
+        material_id = combinacao.get('material_id')
+        pedra_id = combinacao.get('pedra_id')
+        preco = catalogo.preco(id, material_id, pedra_id)
+        resultado.append({
+            'material_id': material_id,
+            'pedra_id': pedra_id,
+            'preco_centavos': preco,
+            'preco_formatado': formatar_reais(preco) if preco is not None else None
+        })
     
-    return jsonify({'preco': preco_total, 'preco_formatado': f'R$ {preco_total:,.2f}'.replace(',', '.')})
+    return jsonify({'produto_id': id, 'precos': resultado})
 
-@app.route('/favoritar/<int:produto_id>', methods=['POST'])
+@bp.route('/favoritar/<int:produto_id>', methods=['POST'])
 @login_required
 def favoritar(produto_id):
     favorito = Favorito.query.filter_by(usuario_id=current_user.id, produto_id=produto_id).first()
@@ -197,103 +369,147 @@ def favoritar(produto_id):
         db.session.commit()
         return jsonify({'favoritado': True, 'message': 'Adicionado aos favoritos'})
 
-@app.route('/adicionar_carrinho', methods=['POST'])
+@bp.route('/adicionar_carrinho', methods=['POST'])
 @login_required
 def adicionar_carrinho():
     data = request.get_json()
     produto_id = data.get('produto_id')
-    quantidade = data.get('quantidade', 1)
     tamanho = data.get('tamanho')
     material_id = data.get('material_id')
     pedra_id = data.get('pedra_id')
+    quantidade = _quantidade_valida(data.get('quantidade', 1))
     
-    produto = Produto.query.get(produto_id)
-    material = Material.query.get(material_id)
-    pedra = Pedra.query.get(pedra_id)
+    produto = catalogo.produto(produto_id)
+    material = catalogo.material(material_id)
+    pedra = catalogo.pedra(pedra_id)
     
-    if not all([produto, material, pedra]):
+    if not all([produto, material, pedra]) or quantidade is None:
         return jsonify({'error': 'Dados inválidos'}), 400
     
-    preco_unitario = float(produto.preco_base) + float(material.preco_adicional) + float(pedra.preco_adicional)
+    carrinho_id = carrinhos.carrinho_id_da_sessao(criar=True)
+    item_id, resumo = carrinhos.store_atual().adicionar(
+        carrinho_id,
+        produto_id=produto.id,
+        quantidade=quantidade,
+        tamanho=tamanho,
+        material_id=material.id,
+        material=material.nome,
+        pedra_id=pedra.id,
+        pedra=pedra.nome,
+        preco_unitario_centavos=catalogo.preco(produto.id, material.id, pedra.id)
+    )
+    carrinhos.registrar_resumo(resumo)
     
-    if 'carrinho' not in session:
-        session['carrinho'] = []
+    return jsonify({'success': True, 'message': 'Produto adicionado ao carrinho', 'item_id': item_id,
+                    'carrinho_count': resumo.quantidade_itens})
+
+@bp.route('/carrinho/item/<int:item_id>/remover', methods=['POST'])
+@login_required
+def remover_item_carrinho(item_id):
+    carrinho_id = carrinhos.carrinho_id_da_sessao()
+    resumo = carrinhos.store_atual().remover(carrinho_id, item_id) if carrinho_id else None
+    if resumo is None:
+        return jsonify({'error': 'Item não encontrado'}), 404
     
-    item = {
-        'produto_id': produto_id,
-        'quantidade': quantidade,
-        'tamanho': tamanho,
-        'material': material.nome,
-        'pedra': pedra.nome,
-        'preco_unitario': preco_unitario,
-        'subtotal': preco_unitario * quantidade
-    }
+    carrinhos.registrar_resumo(resumo)
+    return jsonify(_resumo_json(resumo))
+
+@bp.route('/carrinho/item/<int:item_id>/quantidade', methods=['POST'])
+@login_required
+def atualizar_item_carrinho(item_id):
+    data = request.get_json(silent=True) or {}
+    quantidade = _quantidade_valida(data.get('quantidade'))
+    if quantidade is None:
+        return jsonify({'error': 'Quantidade inválida'}), 400
     
-    session['carrinho'].append(item)
-    session.modified = True
+    carrinho_id = carrinhos.carrinho_id_da_sessao()
+    resumo = carrinhos.store_atual().atualizar_quantidade(carrinho_id, item_id, quantidade) if carrinho_id else None
+    if resumo is None:
+        return jsonify({'error': 'Item não encontrado'}), 404
     
-    return jsonify({'success': True, 'message': 'Produto adicionado ao carrinho', 'carrinho_count': len(session['carrinho'])})
+    carrinhos.registrar_resumo(resumo)
+    return jsonify(_resumo_json(resumo))
+
+def _quantidade_valida(valor):
+    try:
+        quantidade = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return quantidade if 1 <= quantidade <= 10 else None
+
+def _resumo_json(resumo):
+    return {
+        'success': True,
+        'carrinho_count': resumo.quantidade_itens,
+        'total_centavos': resumo.total_centavos,
+        'total_formatado': formatar_reais(resumo.total_centavos)
+    }
+
+def _carrinho_atual():
+    carrinho_id = carrinhos.carrinho_id_da_sessao()
+    if carrinho_id is None:
+        return [], carrinhos.RESUMO_VAZIO
+    store = carrinhos.store_atual()
+    return store.itens(carrinho_id), store.resumo(carrinho_id)
 
-@app.route('/carrinho')
+@bp.route('/carrinho')
 @login_required
 def carrinho():
-    carrinho = session.get('carrinho', [])
-    total = sum(item['subtotal'] for item in carrinho)
-    return render_template('carrinho.html', carrinho=carrinho, total=total)
+    itens, resumo = _carrinho_atual()
+    carrinhos.registrar_resumo(resumo)
+    produtos = {item.produto_id: catalogo.produto(item.produto_id) for item in itens}
+    return render_template('carrinho.html', carrinho=itens, produtos=produtos, total=reais(resumo.total_centavos))
 
-@app.route('/checkout', methods=['GET', 'POST'])
+@bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
-    carrinho = session.get('carrinho', [])
+    chave = None
+    if request.method == 'POST':
+        chave = request.form.get('chave_idempotencia') or request.headers.get('Idempotency-Key')
+        if chave and len(chave) > 64:
+            abort(400)
+    
+    carrinho, resumo = _carrinho_atual()
     if not carrinho:
+        if pedido_por_chave(current_user.id, chave) is not None:
+            flash('Pedido realizado com sucesso!', 'success')
+            return redirect(url_for('loja.pedidos'))
         flash('Seu carrinho está vazio.', 'warning')
-        return redirect(url_for('carrinho'))
+        return redirect(url_for('loja.carrinho'))
     
-    total = sum(item['subtotal'] for item in carrinho)
+    total = reais(resumo.total_centavos)
     
     if request.method == 'POST':
-        metodo_pagamento = request.form.get('metodo_pagamento')
-        
-        pedido = Pedido(
-            usuario_id=current_user.id,
-            status='pendente',
-            total=Decimal(str(total)),
-            metodo_pagamento=metodo_pagamento
-        )
-        db.session.add(pedido)
-        db.session.flush()
+        try:
+            resultado = finalizar_pedido(current_user.id, carrinho, request.form.get('metodo_pagamento'), chave)
+        except CheckoutError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('loja.carrinho'))
         
-        for item in carrinho:
-            item_pedido = ItemPedido(
-                pedido_id=pedido.id,
-                produto_id=item['produto_id'],
-                quantidade=item['quantidade'],
-                tamanho=item['tamanho'],
-                material=item['material'],
-                pedra=item['pedra'],
-                preco_unitario=Decimal(str(item['preco_unitario'])),
-                subtotal=Decimal(str(item['subtotal']))
-            )
-            db.session.add(item_pedido)
-        
-        db.session.commit()
-        session['carrinho'] = []
-        session.modified = True
+        carrinhos.store_atual().limpar(carrinhos.carrinho_id_da_sessao())
+        carrinhos.registrar_resumo(carrinhos.RESUMO_VAZIO)
         
+        if resultado.precos_atualizados:
+            flash('Alguns preços foram atualizados desde que os itens foram adicionados ao carrinho.', 'warning')
         flash('Pedido realizado com sucesso!', 'success')
-        return redirect(url_for('pedidos'))
+        return redirect(url_for('loja.pedidos'))
     
-    return render_template('checkout.html', carrinho=carrinho, total=total)
+    return render_template('checkout.html', carrinho=carrinho, total=total, chave_idempotencia=uuid.uuid4().hex)
 
-@app.route('/pedidos')
+@bp.route('/pedidos')
 @login_required
+@somente_leitura
 def pedidos():
-    pedidos = Pedido.query.filter_by(usuario_id=current_user.id).order_by(Pedido.created_at.desc()).all()
-    return render_template('pedidos.html', pedidos=pedidos)
+    pagina = paginar(pedidos_do_usuario(current_user.id), Pedido.created_at, Pedido.id,
+                     request.args.get('cursor'), current_app.config['ITENS_POR_PAGINA'])
+    return render_template('pedidos.html', pedidos=pagina.itens, proximo_cursor=pagina.proximo_cursor)
 
-@app.route('/avaliar/<int:produto_id>', methods=['POST'])
+@bp.route('/avaliar/<int:produto_id>', methods=['POST'])
 @login_required
 def avaliar(produto_id):
+    if catalogo.produto(produto_id) is None:
+        abort(404)
+    
     form = AvaliacaoForm()
     if form.validate_on_submit():
         avaliacao = Avaliacao(
@@ -302,46 +518,142 @@ def avaliar(produto_id):
             nota=form.nota.data,
             comentario=form.comentario.data
         )
-        db.session.add(avaliacao)
+        registrar_avaliacao(avaliacao)
         db.session.commit()
+        cache_resposta.invalidar('avaliacoes', f'avaliacoes-{produto_id}')
         flash('Avaliação enviada com sucesso!', 'success')
     
-    return redirect(url_for('produto', id=produto_id))
+    return redirect(url_for('loja.produto', id=produto_id))
 
-@app.route('/admin/pedidos')
+@bp.route('/admin/pedidos')
 @admin_required
+@somente_leitura
 def admin_pedidos():
-    pedidos = Pedido.query.order_by(Pedido.created_at.desc()).all()
-    return render_template('admin/pedidos.html', pedidos=pedidos)
+    query = pedidos_com_usuario().filter(*_filtros_da_requisicao(request.args))
+    pagina = paginar(query, Pedido.created_at, Pedido.id, request.args.get('cursor'), current_app.config['ITENS_POR_PAGINA'])
+    return render_template('admin/pedidos.html', pedidos=pagina.itens, proximo_cursor=pagina.proximo_cursor,
+                           status_pedido=STATUS_PEDIDO)
+
+def _data_do_filtro(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def _filtros_da_requisicao(args):
+    return filtros_pedidos(args.get('status'), _data_do_filtro(args.get('de')), _data_do_filtro(args.get('ate')))
+
+@bp.route('/admin/pedidos/exportar')
+@admin_required
+def admin_exportar_pedidos():
+    formato = request.args.get('formato', 'csv')
+    if formato == 'ndjson':
+        gerador, mimetype = exportar_ndjson, 'application/x-ndjson'
+    elif formato == 'csv':
+        gerador, mimetype = exportar_csv, 'text/csv'
+    else:
+        abort(400)
+    
+    nome = f'pedidos-{datetime.utcnow():%Y%m%d-%H%M%S}.{formato}'
+    return Response(stream_with_context(gerador(_filtros_da_requisicao(request.args))), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={nome}', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/admin/pedidos/atualizar-status', methods=['POST'])
+@admin_required
+def admin_atualizar_status_em_lote():
+    novo_status = request.form.get('novo_status')
+    if novo_status not in STATUS_PEDIDO:
+        flash('Status inválido.', 'error')
+        return redirect(url_for('loja.admin_pedidos'))
+    
+    if request.form.get('escopo') == 'filtro':
+        condicoes = _filtros_da_requisicao(request.form)
+        if not condicoes:
+            flash('Filtre os pedidos antes de alterar todos de uma vez.', 'warning')
+            return redirect(url_for('loja.admin_pedidos'))
+        filtro = {chave: request.form.get(chave) for chave in ('status', 'de', 'ate') if request.form.get(chave)}
+    else:
+        ids = request.form.getlist('pedido_ids', type=int)
+        if not ids:
+            flash('Nenhum pedido selecionado.', 'warning')
+            return redirect(url_for('loja.admin_pedidos'))
+        condicoes = [Pedido.id.in_(ids)]
+        filtro = {}
+    
+    alterados = atualizar_status_em_lote(condicoes, novo_status)
+    db.session.commit()
+    flash(f'{alterados} pedido(s) atualizado(s) para {novo_status}.', 'success')
+    return redirect(url_for('loja.admin_pedidos', **filtro))
 
-@app.route('/admin/pedido/<int:pedido_id>')
+@bp.route('/admin/pedido/<int:pedido_id>')
 @admin_required
+@somente_leitura
 def admin_pedido_detalhes(pedido_id):
-    pedido = Pedido.query.get_or_404(pedido_id)
+    pedido = pedido_detalhado(pedido_id).first_or_404()
     return render_template('admin/pedido_detalhes.html', pedido=pedido)
 
-@app.route('/admin/pedido/<int:pedido_id>/atualizar-status', methods=['POST'])
+@bp.route('/admin/pedido/<int:pedido_id>/atualizar-status', methods=['POST'])
 @admin_required
 def admin_atualizar_status(pedido_id):
     pedido = Pedido.query.get_or_404(pedido_id)
     novo_status = request.form.get('status')
     
-    if novo_status in ['pendente', 'processando', 'enviado', 'entregue', 'cancelado']:
+    if novo_status in STATUS_PEDIDO:
+        status_anterior = pedido.status
         pedido.status = novo_status
+        if novo_status != status_anterior:
+            if 'cancelado' in (novo_status, status_anterior):
+                ajustar_por_consulta([Pedido.id == pedido.id], -1 if novo_status == 'cancelado' else 1)
+            tarefas.enfileirar('pedido.status_alterado', pedido_id=pedido.id,
+                               status_anterior=status_anterior, status=novo_status)
         db.session.commit()
         flash(f'Status do pedido #{pedido_id} atualizado para {novo_status}.', 'success')
     else:
         flash('Status inválido.', 'error')
     
-    return redirect(url_for('admin_pedido_detalhes', pedido_id=pedido_id))
+    return redirect(url_for('loja.admin_pedido_detalhes', pedido_id=pedido_id))
 
-@app.route('/admin/produtos')
+@bp.route('/admin/metricas')
 @admin_required
+def admin_metricas():
+    return render_template('admin/metricas.html', endpoints=metricas.resumo(),
+                           limiar_lento_ms=metricas.limiar_lento_ms)
+
+@bp.route('/admin/vendas')
+@admin_required
+@somente_leitura
+def admin_vendas():
+    ate = _data_do_filtro(request.args.get('ate')) or datetime.utcnow()
+    de = _data_do_filtro(request.args.get('de')) or ate - timedelta(days=29)
+    return render_template('admin/vendas.html', painel=painel(de.date(), ate.date()), de=de, ate=ate,
+                           formatar_reais=formatar_reais)
+
+@bp.route('/admin/tarefas')
+@admin_required
+@somente_leitura
+def admin_tarefas():
+    mortas = (Tarefa.query.filter_by(status='morta')
+              .order_by(Tarefa.disponivel_em.desc(), Tarefa.id.desc()).limit(50).all())
+    return render_template('admin/tarefas.html', estatisticas=tarefas.estatisticas(), mortas=mortas)
+
+@bp.route('/admin/tarefa/<int:tarefa_id>/reprocessar', methods=['POST'])
+@admin_required
+def admin_reprocessar_tarefa(tarefa_id):
+    if tarefas.reprocessar(tarefa_id):
+        flash(f'Tarefa #{tarefa_id} voltou para a fila.', 'success')
+    else:
+        flash('Tarefa não encontrada ou não está morta.', 'error')
+    return redirect(url_for('loja.admin_tarefas'))
+
+@bp.route('/admin/produtos')
+@admin_required
+@somente_leitura
 def admin_produtos():
-    produtos = Produto.query.all()
-    return render_template('admin/produtos.html', produtos=produtos)
+    pagina = paginar(Produto.query, Produto.created_at, Produto.id,
+                     request.args.get('cursor'), current_app.config['ITENS_POR_PAGINA'])
+    return render_template('admin/produtos.html', produtos=pagina.itens, proximo_cursor=pagina.proximo_cursor)
 
-@app.route('/admin/produto/novo', methods=['GET', 'POST'])
+@bp.route('/admin/produto/novo', methods=['GET', 'POST'])
 @admin_required
 def admin_produto_novo():
     if request.method == 'POST':
@@ -353,13 +665,17 @@ def admin_produto_novo():
             ativo=request.form.get('ativo') == 'on'
         )
         db.session.add(produto)
+        db.session.flush()
+        busca.backend_atual().indexar(produto)
+        imagens.agendar(produto)
         db.session.commit()
+        catalogo.invalidar()
         flash('Produto cadastrado com sucesso!', 'success')
-        return redirect(url_for('admin_produtos'))
+        return redirect(url_for('loja.admin_produtos'))
     
     return render_template('admin/produto_form.html')
 
-@app.route('/admin/produto/<int:produto_id>/editar', methods=['GET', 'POST'])
+@bp.route('/admin/produto/<int:produto_id>/editar', methods=['GET', 'POST'])
 @admin_required
 def admin_produto_editar(produto_id):
     produto = Produto.query.get_or_404(produto_id)
@@ -368,23 +684,30 @@ def admin_produto_editar(produto_id):
         produto.nome = request.form.get('nome')
         produto.descricao = request.form.get('descricao')
         produto.preco_base = Decimal(request.form.get('preco_base'))
+        imagem_anterior = produto.imagem_url
         produto.imagem_url = request.form.get('imagem_url')
         produto.ativo = request.form.get('ativo') == 'on'
+        busca.backend_atual().indexar(produto)
+        if produto.imagem_url != imagem_anterior:
+            imagens.agendar(produto)
         db.session.commit()
+        catalogo.invalidar()
         flash('Produto atualizado com sucesso!', 'success')
-        return redirect(url_for('admin_produtos'))
+        return redirect(url_for('loja.admin_produtos'))
     
     return render_template('admin/produto_form.html', produto=produto)
 
-@app.route('/admin/produto/<int:produto_id>/remover', methods=['POST'])
+@bp.route('/admin/produto/<int:produto_id>/remover', methods=['POST'])
 @admin_required
 def admin_produto_remover(produto_id):
     produto = Produto.query.get_or_404(produto_id)
     db.session.delete(produto)
+    busca.backend_atual().remover(produto_id)
     db.session.commit()
+    catalogo.invalidar()
     flash('Produto removido com sucesso!', 'success')
-    return redirect(url_for('admin_produtos'))
+    return redirect(url_for('loja.admin_produtos'))
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
 
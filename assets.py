@@ -0,0 +1,259 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import subprocess
+import tempfile
+import urllib.request
+from functools import wraps
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PRELINE_URL = 'https://cdn.jsdelivr.net/npm/preline@2.0.3/dist/preline.min.js'
+FONTES_URL = ('https://fonts.googleapis.com/css2?family=Cinzel:wght@400;500;600;700'
+              '&family=Lora:wght@400;500;600;700&family=Poppins:wght@300;400;500;600;700&display=swap')
+# O Google Fonts só devolve woff2 para navegadores que ele reconhece.
+AGENTE_NAVEGADOR = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+MAX_AGE_IMUTAVEL = 31536000
+COMPRIMIVEIS = {'.css', '.js', '.svg', '.json', '.txt', '.map', '.ico', '.html'}
+TAMANHO_MINIMO_COMPRESSAO = 256
+CODIFICACOES = (('br', '.br'), ('gzip', '.gz'))
+
+_IMPORT_CSS = re.compile(r'@import\s+url\([^)]*\)[^;]*;\s*')
+_URL_STATIC = re.compile(r'url\(\s*([\'"]?)/static/([^\'")?#]+)([^\'")]*)\1\s*\)')
+_URL_FONTE = re.compile(r'url\((https://fonts\.gstatic\.com/s/[^)]+)\)')
+
+
+class Assets:
+    """Arquivos estáticos com hash de conteúdo no nome.
+
+    `flask construir-assets` copia cada arquivo de static/ (e os pacotes
+    gerados) para static/dist/ com o hash no nome, grava as variantes gzip e
+    brotli e um manifest.json. Com o manifesto carregado, url_for('static')
+    passa a apontar para a versão com hash, servida com cache imutável; sem
+    ele tudo continua como antes.
+    """
+
+    def __init__(self, app=None):
+        self.arquivos = {}
+        self.variantes = {}
+        self.dir_static = None
+        self.dir_dist = None
+        self.dir_fontes = None
+        self.prefixo = '/static/'
+        self.tailwind = 'tailwindcss'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.dir_static = app.static_folder
+        self.dir_dist = os.path.join(app.static_folder, 'dist')
+        self.dir_fontes = app.config.get('ASSETS_DIR') or os.path.join(app.root_path, 'assets')
+        self.tailwind = app.config.get('ASSETS_TAILWIND_CLI', 'tailwindcss')
+        self.prefixo = f'{app.static_url_path}/'
+        self.carregar()
+
+        app.url_defaults(self._resolver)
+        app.add_template_global(self.construido, 'asset_construido')
+        app.add_template_filter(self.versionar, 'versionar')
+        servir_original = app.view_functions['static']
+
+        @wraps(servir_original)
+        def servir(filename, **kwargs):
+            if filename in self.variantes:
+                return self._servir_versionado(filename)
+            return servir_original(filename=filename, **kwargs)
+
+        app.view_functions['static'] = servir
+        app.extensions['assets'] = self
+
+    def carregar(self):
+        try:
+            with open(os.path.join(self.dir_dist, 'manifest.json')) as f:
+                manifesto = json.load(f)
+        except (FileNotFoundError, ValueError):
+            manifesto = {'arquivos': {}, 'variantes': {}}
+        self.arquivos = {origem: f'dist/{destino}' for origem, destino in manifesto['arquivos'].items()}
+        self.variantes = {f'dist/{destino}': codificacoes for destino, codificacoes in manifesto['variantes'].items()}
+
+    def construido(self, filename):
+        return filename in self.arquivos
+
+    def versionar(self, url):
+        """Troca uma URL /static/... gravada no banco (como imagem_url) pela
+        versão com hash, quando ela existe."""
+        if url and url.startswith(self.prefixo):
+            versionado = self.arquivos.get(url[len(self.prefixo):])
+            if versionado is not None:
+                return self.prefixo + versionado
+        return url
+
+    def _resolver(self, endpoint, values):
+        if endpoint == 'static':
+            versionado = self.arquivos.get(values.get('filename'))
+            if versionado is not None:
+                values['filename'] = versionado
+
+    def _servir_versionado(self, filename):
+        disponiveis = self.variantes[filename]
+        aceitas = request.accept_encodings
+        codificacao, extensao = None, ''
+        for candidata, sufixo in CODIFICACOES:
+            if candidata in disponiveis and aceitas[candidata]:
+                codificacao, extensao = candidata, sufixo
+                break
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        resposta = send_from_directory(self.dir_static, filename + extensao, mimetype=mimetype,
+                                       max_age=MAX_AGE_IMUTAVEL)
+        resposta.headers.pop('Content-Disposition', None)
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+        if disponiveis:
+            resposta.vary.add('Accept-Encoding')
+        resposta.cache_control.public = True
+        resposta.cache_control.immutable = True
+        return resposta
+
+    def vendorizar(self):
+        """Baixa o Preline e as fontes do Google para dentro do projeto, para
+        que a página não dependa de terceiros ao renderizar."""
+        destino = os.path.join(self.dir_fontes, 'vendor')
+        os.makedirs(destino, exist_ok=True)
+        with open(os.path.join(destino, 'preline.min.js'), 'wb') as f:
+            f.write(_baixar(PRELINE_URL))
+
+        dir_fontes = os.path.join(self.dir_static, 'fonts')
+        os.makedirs(dir_fontes, exist_ok=True)
+
+        def trocar(encontrado):
+            url = encontrado.group(1)
+            nome = url.split('/s/', 1)[1].replace('/', '-')
+            with open(os.path.join(dir_fontes, nome), 'wb') as f:
+                f.write(_baixar(url))
+            return f'url(/static/fonts/{nome})'
+
+        fontes = _URL_FONTE.sub(trocar, _baixar(FONTES_URL).decode())
+        with open(os.path.join(destino, 'fontes.css'), 'w') as f:
+            f.write(fontes)
+        return ['vendor/preline.min.js', 'vendor/fontes.css', 'static/fonts/']
+
+    def construir(self):
+        """Gera static/dist/ e o manifesto; devolve (origem, destino) de cada
+        arquivo. Arquivos de builds anteriores ficam, porque páginas em cache
+        ainda podem apontar para eles."""
+        os.makedirs(self.dir_dist, exist_ok=True)
+        arquivos, variantes = {}, {}
+
+        for origem in self._arquivos_static():
+            with open(os.path.join(self.dir_static, origem), 'rb') as f:
+                self._gravar(origem, f.read(), arquivos, variantes)
+
+        for origem, conteudo in self._pacotes(arquivos):
+            self._gravar(origem, conteudo, arquivos, variantes)
+
+        temporario = os.path.join(self.dir_dist, f'manifest.json.{os.getpid()}')
+        with open(temporario, 'w') as f:
+            json.dump({'arquivos': arquivos, 'variantes': variantes}, f, indent=2, sort_keys=True)
+        os.replace(temporario, os.path.join(self.dir_dist, 'manifest.json'))
+        self.carregar()
+        return sorted(arquivos.items())
+
+    def _arquivos_static(self):
+        for raiz, pastas, nomes in os.walk(self.dir_static):
+            if raiz == self.dir_static:
+                pastas[:] = [pasta for pasta in pastas if pasta != 'dist']
+            for nome in nomes:
+                yield os.path.relpath(os.path.join(raiz, nome), self.dir_static).replace(os.sep, '/')
+
+    def _gravar(self, origem, conteudo, arquivos, variantes):
+        base, extensao = os.path.splitext(origem)
+        destino = f'{base}.{hashlib.sha256(conteudo).hexdigest()[:12]}{extensao}'
+        caminho = os.path.join(self.dir_dist, destino)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+        codificacoes = []
+        if extensao in COMPRIMIVEIS and len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            comprimidos = [('gzip', '.gz', gzip.compress(conteudo, 9, mtime=0))]
+            if brotli is not None:
+                comprimidos.insert(0, ('br', '.br', brotli.compress(conteudo, quality=11)))
+            for codificacao, sufixo, comprimido in comprimidos:
+                if len(comprimido) < len(conteudo):
+                    _escrever(caminho + sufixo, comprimido)
+                    codificacoes.append(codificacao)
+        _escrever(caminho, conteudo)
+
+        arquivos[origem] = destino
+        variantes[destino] = codificacoes
+
+    def _pacotes(self, arquivos):
+        """Pacotes que substituem os CDNs no base.html; cada um só é gerado se
+        todas as suas partes estiverem disponíveis."""
+        preline = os.path.join(self.dir_fontes, 'vendor', 'preline.min.js')
+        if os.path.exists(preline):
+            with open(preline, 'rb') as f:
+                yield 'js/lume.js', f.read()
+
+        tailwind = self._compilar_tailwind()
+        if tailwind is None:
+            return
+        partes = [tailwind]
+        fontes = os.path.join(self.dir_fontes, 'vendor', 'fontes.css')
+        vendorizadas = os.path.exists(fontes)
+        if vendorizadas:
+            with open(fontes) as f:
+                partes.append(f.read())
+        with open(os.path.join(self.dir_static, 'css', 'custom.css')) as f:
+            partes.append(f.read())
+
+        # @import só vale no topo da folha; com as fontes vendorizadas o do
+        # Google Fonts sai de vez.
+        css = '\n'.join(partes)
+        imports = [trecho.strip() for trecho in _IMPORT_CSS.findall(css)
+                   if not (vendorizadas and 'fonts.googleapis.com' in trecho)]
+        css = '\n'.join([*imports, _IMPORT_CSS.sub('', css)])
+
+        def versionar(encontrado):
+            aspas, caminho, sufixo = encontrado.groups()
+            destino = arquivos.get(caminho)
+            if destino is None:
+                return encontrado.group(0)
+            return f'url({aspas}/static/dist/{destino}{sufixo}{aspas})'
+
+        yield 'css/lume.css', _URL_STATIC.sub(versionar, css).encode()
+
+    def _compilar_tailwind(self):
+        entrada = os.path.join(self.dir_fontes, 'tailwind.css')
+        configuracao = os.path.join(self.dir_fontes, 'tailwind.config.js')
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'tailwind.css')
+            try:
+                subprocess.run([self.tailwind, '-c', configuracao, '-i', entrada, '-o', saida, '--minify'],
+                               check=True, capture_output=True)
+            except FileNotFoundError:
+                return None
+            with open(saida) as f:
+                return f.read()
+
+
+def _baixar(url):
+    with urllib.request.urlopen(urllib.request.Request(url, headers={'User-Agent': AGENTE_NAVEGADOR}),
+                                timeout=30) as resposta:
+        return resposta.read()
+
+
+def _escrever(caminho, conteudo):
+    temporario = f'{caminho}.{os.getpid()}'
+    with open(temporario, 'wb') as f:
+        f.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+assets = Assets()
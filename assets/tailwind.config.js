@@ -0,0 +1,11 @@
+/**
+ * Mesma configuração padrão que o cdn.tailwindcss.com usava no navegador.
+ * O CLI só encontra classes escritas por inteiro nos templates: monte o nome
+ * completo ('bg-red-500'), nunca pedaços ('bg-{{ cor }}-500').
+ */
+module.exports = {
+  content: {
+    relative: true,
+    files: ['../templates/**/*.html'],
+  },
+};
@@ -0,0 +1,64 @@
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, Avaliacao, ResumoAvaliacao
+
+NOTAS = range(1, 6)
+
+
+def registrar_avaliacao(avaliacao):
+    """Adiciona a avaliação e atualiza o resumo do produto na mesma transação.
+
+    O resumo é incrementado com um UPDATE atômico; só na primeira avaliação do
+    produto a linha é criada. Quem chama é responsável pelo commit.
+    """
+    db.session.add(avaliacao)
+    incremento = {
+        'quantidade': ResumoAvaliacao.quantidade + 1,
+        'soma': ResumoAvaliacao.soma + avaliacao.nota,
+        f'nota_{avaliacao.nota}': getattr(ResumoAvaliacao, f'nota_{avaliacao.nota}') + 1,
+    }
+    comando = update(ResumoAvaliacao).where(ResumoAvaliacao.produto_id == avaliacao.produto_id).values(**incremento)
+    if db.session.execute(comando).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(ResumoAvaliacao).values(
+                produto_id=avaliacao.produto_id,
+                quantidade=1,
+                soma=avaliacao.nota,
+                **{f'nota_{nota}': int(nota == avaliacao.nota) for nota in NOTAS}
+            ))
+    except IntegrityError:
+        db.session.execute(comando)
+
+
+def resumos_por_produto(produto_ids):
+    if not produto_ids:
+        return {}
+    resumos = ResumoAvaliacao.query.filter(ResumoAvaliacao.produto_id.in_(produto_ids)).all()
+    return {resumo.produto_id: resumo for resumo in resumos}
+
+
+def reconstruir_resumos():
+    """Recalcula todos os resumos a partir da tabela de avaliações."""
+    colunas = [
+        Avaliacao.produto_id,
+        func.count(Avaliacao.id),
+        func.coalesce(func.sum(Avaliacao.nota), 0),
+    ] + [func.sum(case((Avaliacao.nota == nota, 1), else_=0)) for nota in NOTAS]
+    linhas = db.session.execute(select(*colunas).group_by(Avaliacao.produto_id)).all()
+
+    db.session.execute(ResumoAvaliacao.__table__.delete())
+    if linhas:
+        db.session.execute(insert(ResumoAvaliacao), [
+            {
+                'produto_id': produto_id,
+                'quantidade': quantidade,
+                'soma': soma,
+                **{f'nota_{nota}': contagens[nota - 1] for nota in NOTAS}
+            }
+            for produto_id, quantidade, soma, *contagens in linhas
+        ])
+    db.session.commit()
+    return len(linhas)
@@ -0,0 +1,194 @@
+from decimal import Decimal
+from sqlalchemy import UniqueConstraint, inspect, text
+from sqlalchemy.schema import CreateTable
+from models import db, User, Produto, Material, Pedra, Tamanho, VendaDiaria, VendaDiariaItem, ResumoAvaliacao
+import busca
+from avaliacoes import reconstruir_resumos
+from vendas import reconstruir_vendas
+from imagens import agendar as agendar_imagens
+
+
+def criar_tabelas():
+    db.create_all()
+    busca.backend_atual().criar_indice()
+    db.session.commit()
+
+
+def semear_dados_iniciais():
+    if not Produto.query.first():
+        produto = Produto(
+            nome="Anel Solitário Lume",
+            descricao="Um anel que captura a essência da luz e da elegância. Cada detalhe foi cuidadosamente pensado para transmitir sofisticação e significado único. O brilho do diamante central reflete não apenas a luz, mas também os sentimentos mais profundos.",
+            preco_base=Decimal('2999.00'),
+            imagem_url="/static/imgs/logo.png",
+            ativo=True
+        )
+        db.session.add(produto)
+        db.session.flush()
+        busca.backend_atual().indexar(produto)
+        agendar_imagens(produto)
+        
+        materiais = [
+            Material(nome="Ouro 18k", preco_adicional=Decimal('500.00')),
+            Material(nome="Ouro 14k", preco_adicional=Decimal('300.00')),
+            Material(nome="Prata 925", preco_adicional=Decimal('0.00'))
+        ]
+        for material in materiais:
+            db.session.add(material)
+        
+        pedras = [
+            Pedra(nome="Diamante", preco_adicional=Decimal('1000.00')),
+            Pedra(nome="Rubi", preco_adicional=Decimal('600.00')),
+            Pedra(nome="Safira", preco_adicional=Decimal('600.00')),
+            Pedra(nome="Esmeralda", preco_adicional=Decimal('500.00'))
+        ]
+        for pedra in pedras:
+            db.session.add(pedra)
+        
+        tamanhos = [Tamanho(tamanho=str(i)) for i in range(10, 21)]
+        for tamanho in tamanhos:
+            db.session.add(tamanho)
+        
+        if not User.query.filter_by(email="admin@lume.com").first():
+            admin = User(
+                nome="Administrador",
+                email="admin@lume.com",
+                is_admin=True
+            )
+            admin.set_password("admin123")
+            db.session.add(admin)
+        
+        db.session.commit()
+
+
+def migrar():
+    """Leva um banco existente ao esquema atual dos modelos.
+
+    Cria tabelas ausentes e acrescenta colunas e índices declarados nos
+    modelos depois que o banco foi criado. Colunas novas entram como
+    anuláveis; as únicas ganham um índice único à parte, já que o SQLite não
+    aceita UNIQUE em ALTER TABLE ADD COLUMN. Restrições únicas que saíram dos
+    modelos são removidas (no SQLite, recriando a tabela), e tabelas
+    derivadas criadas agora (índice de busca, rollups, resumos de
+    avaliação) são preenchidas a
+    partir dos dados existentes. Devolve a lista de alterações.
+    """
+    inspetor = inspect(db.engine)
+    existentes = set(inspetor.get_table_names())
+    preparador = db.engine.dialect.identifier_preparer
+    alteracoes = []
+    criadas = set()
+
+    with db.engine.begin() as conexao:
+        for tabela in db.metadata.sorted_tables:
+            if tabela.name not in existentes:
+                tabela.create(conexao)
+                criadas.add(tabela.name)
+                alteracoes.append(f'tabela {tabela.name}')
+                continue
+
+            colunas = {coluna['name'] for coluna in inspetor.get_columns(tabela.name)}
+            for coluna in tabela.columns:
+                if coluna.name in colunas:
+                    continue
+                tipo = coluna.type.compile(dialect=db.engine.dialect)
+                conexao.execute(text(
+                    f'ALTER TABLE {preparador.format_table(tabela)} ADD COLUMN {preparador.format_column(coluna)} {tipo}'
+                ))
+                alteracoes.append(f'coluna {tabela.name}.{coluna.name}')
+                if coluna.unique:
+                    nome = f'uq_{tabela.name}_{coluna.name}'
+                    conexao.execute(text(
+                        f'CREATE UNIQUE INDEX {preparador.quote(nome)} '
+                        f'ON {preparador.format_table(tabela)} ({preparador.format_column(coluna)})'
+                    ))
+                    alteracoes.append(f'índice {nome}')
+
+            if _remover_unicos_obsoletos(conexao, inspetor, tabela, alteracoes):
+                continue
+
+            indices = {indice['name'] for indice in inspetor.get_indexes(tabela.name)}
+            for indice in tabela.indexes:
+                if indice.name not in indices:
+                    indice.create(conexao)
+                    alteracoes.append(f'índice {indice.name}')
+
+    indice_busca = busca.backend_atual()
+    if indice_busca.tabela and indice_busca.tabela not in existentes:
+        indice_busca.criar_indice()
+        indice_busca.reconstruir()
+        db.session.commit()
+        alteracoes.append(f'índice de busca {indice_busca.tabela}')
+
+    # Rollups e resumos criados agora partem vazios; sem reconstruir, o painel
+    # não teria histórico, cancelar um pedido antigo deixaria o dia negativo e
+    # as médias contariam só as avaliações novas.
+    if criadas & {VendaDiaria.__tablename__, VendaDiariaItem.__tablename__}:
+        dias = reconstruir_vendas()
+        alteracoes.append(f'rollups de vendas reconstruídos ({dias} dia(s))')
+    if ResumoAvaliacao.__tablename__ in criadas:
+        produtos = reconstruir_resumos()
+        alteracoes.append(f'resumos de avaliação reconstruídos ({produtos} produto(s))')
+
+    return alteracoes
+
+
+def _unicos_do_modelo(tabela):
+    unicos = [(coluna.name,) for coluna in tabela.columns if coluna.unique]
+    unicos += [[coluna.name for coluna in indice.columns] for indice in tabela.indexes if indice.unique]
+    unicos += [[coluna.name for coluna in restricao.columns] for restricao in tabela.constraints
+               if isinstance(restricao, UniqueConstraint)]
+    return {frozenset(colunas) for colunas in unicos}
+
+
+def _restricoes_unicas(conexao, inspetor, tabela):
+    if conexao.dialect.name != 'sqlite':
+        return inspetor.get_unique_constraints(tabela.name)
+    # O inspetor do SQLite não enxerga o UNIQUE escrito na própria coluna;
+    # o índice automático dele aparece em index_list com origem 'u'.
+    preparador = conexao.dialect.identifier_preparer
+    restricoes = []
+    for linha in conexao.execute(text(f'PRAGMA index_list({preparador.quote(tabela.name)})')).mappings():
+        if linha['origin'] == 'u':
+            colunas = conexao.execute(text(f"PRAGMA index_info({preparador.quote(linha['name'])})")).mappings()
+            restricoes.append({'name': None, 'column_names': [coluna['name'] for coluna in colunas]})
+    return restricoes
+
+
+def _remover_unicos_obsoletos(conexao, inspetor, tabela, alteracoes):
+    """Remove índices e restrições únicas do banco que o modelo não declara
+    mais. Devolve True quando a tabela foi recriada, já com os índices atuais."""
+    preparador = conexao.dialect.identifier_preparer
+    unicos = _unicos_do_modelo(tabela)
+
+    for indice in inspetor.get_indexes(tabela.name):
+        if indice['unique'] and frozenset(indice['column_names']) not in unicos:
+            conexao.execute(text(f"DROP INDEX {preparador.quote(indice['name'])}"))
+            alteracoes.append(f"índice {indice['name']} removido")
+
+    obsoletas = [restricao for restricao in _restricoes_unicas(conexao, inspetor, tabela)
+                 if frozenset(restricao['column_names']) not in unicos]
+    if not obsoletas:
+        return False
+    if conexao.dialect.name != 'sqlite':
+        for restricao in obsoletas:
+            conexao.execute(text(f"ALTER TABLE {preparador.format_table(tabela)} "
+                                 f"DROP CONSTRAINT {preparador.quote(restricao['name'])}"))
+            alteracoes.append(f"restrição {restricao['name'] or tabela.name} removida")
+        return False
+
+    # O SQLite não remove restrições de uma tabela existente: cria a tabela
+    # nova com outro nome, copia as linhas, apaga a antiga e renomeia.
+    nome = preparador.format_table(tabela)
+    temporaria = preparador.quote(f'{tabela.name}__migracao')
+    colunas = ', '.join(preparador.format_column(coluna) for coluna in tabela.columns)
+    ddl = str(CreateTable(tabela).compile(dialect=conexao.dialect))
+    conexao.execute(text(ddl.replace(f'CREATE TABLE {nome}', f'CREATE TABLE {temporaria}', 1)))
+    conexao.execute(text(f'INSERT INTO {temporaria} ({colunas}) SELECT {colunas} FROM {nome}'))
+    conexao.execute(text(f'DROP TABLE {nome}'))
+    conexao.execute(text(f'ALTER TABLE {temporaria} RENAME TO {nome}'))
+    for indice in tabela.indexes:
+        indice.create(conexao)
+    alteracoes.append(f'tabela {tabela.name} recriada sem ' +
+                      ', '.join(f"UNIQUE({', '.join(restricao['column_names'])})" for restricao in obsoletas))
+    return True
@@ -0,0 +1,34 @@
+"""Benchmarks reproduzíveis da loja, executados offline contra SQLite.
+
+    python -m benchmarks semear --banco bench.db --produtos 2000 --usuarios 20000 \\
+        --pedidos 1000000 --avaliacoes 1000000
+    python -m benchmarks executar --banco bench.db --usuarios-virtuais 8 --duracao 30 \\
+        --saida resultado.json --baseline baseline.json
+    python -m benchmarks comparar baseline.json resultado.json
+    python -m benchmarks inicializacao --banco bench.db --repeticoes 10
+    python -m benchmarks concorrencia --banco bench.db --processos 4 --duracao 10
+    python -m benchmarks limitador --requisicoes 20000 --clientes 1000
+    python -m benchmarks sugestoes --produtos 100000 --repeticoes 50
+"""
+import os
+
+
+def carregar_app(banco, **config):
+    """Cria a aplicação apontando para o banco do benchmark, já inicializado."""
+    from app import create_app
+    from banco import criar_tabelas, semear_dados_iniciais
+    from config import Config
+
+    class ConfigBenchmark(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(banco)
+        RATELIMIT_ENABLED = False
+        METRICAS_LIMIAR_LENTO_MS = float('inf')
+
+    for chave, valor in config.items():
+        setattr(ConfigBenchmark, chave, valor)
+
+    app = create_app(ConfigBenchmark)
+    with app.app_context():
+        criar_tabelas()
+        semear_dados_iniciais()
+    return app
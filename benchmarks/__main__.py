@@ -0,0 +1,124 @@
+import argparse
+import json
+import sys
+
+from benchmarks import carregar_app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks da loja Lume')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    semear = subparsers.add_parser('semear', help='popula um banco SQLite com dados sintéticos')
+    semear.add_argument('--banco', default='bench.db')
+    semear.add_argument('--produtos', type=int, default=2000)
+    semear.add_argument('--usuarios', type=int, default=20000)
+    semear.add_argument('--pedidos', type=int, default=100000)
+    semear.add_argument('--avaliacoes', type=int, default=100000)
+    semear.add_argument('--semente', type=int, default=42)
+
+    executar = subparsers.add_parser('executar', help='executa o funil com usuários virtuais')
+    executar.add_argument('--banco', default='bench.db')
+    executar.add_argument('--usuarios-virtuais', type=int, default=8)
+    executar.add_argument('--duracao', type=float, default=30)
+    executar.add_argument('--url', help='servidor local (ex.: http://127.0.0.1:8000); padrão: test client')
+    executar.add_argument('--semente', type=int, default=42)
+    executar.add_argument('--saida', help='arquivo JSON do relatório (padrão: stdout)')
+    executar.add_argument('--baseline', help='relatório anterior para comparação')
+    executar.add_argument('--tolerancia', type=float, default=10.0, help='regressão tolerada, em %%')
+
+    inicializacao = subparsers.add_parser('inicializacao', help='mede o tempo de subida de um worker')
+    inicializacao.add_argument('--banco', default='bench.db')
+    inicializacao.add_argument('--repeticoes', type=int, default=10)
+
+    senhas = subparsers.add_parser('senhas', help='mede o custo do hash de senha por conjunto de parâmetros')
+    senhas.add_argument('--metodo', action='append', help='ex.: scrypt:32768:8:1 (pode repetir)')
+    senhas.add_argument('--repeticoes', type=int, default=5)
+
+    concorrencia = subparsers.add_parser('concorrencia', help='mede leituras e escritas concorrentes no SQLite')
+    concorrencia.add_argument('--banco', default='bench.db')
+    concorrencia.add_argument('--processos', type=int, default=4)
+    concorrencia.add_argument('--duracao', type=float, default=10)
+    concorrencia.add_argument('--fracao-escrita', type=float, default=0.2)
+
+    limites = subparsers.add_parser('limitador', help='mede o custo do rate limit por requisição')
+    limites.add_argument('--requisicoes', type=int, default=20000)
+    limites.add_argument('--clientes', type=int, default=1000)
+
+    sugestoes = subparsers.add_parser('sugestoes', help='mede a latência do autocompletar da busca')
+    sugestoes.add_argument('--produtos', type=int, default=100000)
+    sugestoes.add_argument('--repeticoes', type=int, default=50)
+    sugestoes.add_argument('--semente', type=int, default=42)
+
+    comparar = subparsers.add_parser('comparar', help='compara dois relatórios JSON')
+    comparar.add_argument('baseline')
+    comparar.add_argument('atual')
+    comparar.add_argument('--tolerancia', type=float, default=10.0, help='regressão tolerada, em %%')
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'semear':
+        from benchmarks.semear import semear as semear_banco
+        app = carregar_app(args.banco)
+        decorrido = semear_banco(app, args.produtos, args.usuarios, args.pedidos, args.avaliacoes,
+                                 semente=args.semente)
+        print(f'Banco {args.banco} populado em {decorrido:.1f}s.', file=sys.stderr)
+        return 0
+
+    if args.comando == 'executar':
+        from benchmarks.carga import executar as executar_carga, comparar as comparar_relatorios
+        app = carregar_app(args.banco)
+        relatorio = executar_carga(app, args.usuarios_virtuais, args.duracao, url=args.url, semente=args.semente)
+        conteudo = json.dumps(relatorio, indent=2, ensure_ascii=False)
+        if args.saida:
+            with open(args.saida, 'w') as f:
+                f.write(conteudo + '\n')
+        else:
+            print(conteudo)
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                linhas, regressao = comparar_relatorios(json.load(f), relatorio, args.tolerancia)
+            print('\n'.join(linhas), file=sys.stderr)
+            return 1 if regressao else 0
+        return 0
+
+    if args.comando == 'inicializacao':
+        from benchmarks.inicializacao import medir
+        carregar_app(args.banco)
+        print(json.dumps(medir(args.banco, args.repeticoes), indent=2, ensure_ascii=False))
+        return 0
+
+    if args.comando == 'senhas':
+        from benchmarks.senhas import medir
+        print(json.dumps(medir(args.metodo, args.repeticoes), indent=2, ensure_ascii=False))
+        return 0
+
+    if args.comando == 'concorrencia':
+        from benchmarks.concorrencia import medir
+        print(json.dumps(medir(args.banco, args.processos, args.duracao, args.fracao_escrita), indent=2,
+                         ensure_ascii=False))
+        return 0
+
+    if args.comando == 'limitador':
+        from benchmarks.limitador import medir
+        print(json.dumps(medir(args.requisicoes, args.clientes), indent=2, ensure_ascii=False))
+        return 0
+
+    if args.comando == 'sugestoes':
+        from benchmarks.sugestoes import medir
+        print(json.dumps(medir(args.produtos, args.repeticoes, args.semente), indent=2, ensure_ascii=False))
+        return 0
+
+    from benchmarks.carga import comparar as comparar_relatorios
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.atual) as f:
+        atual = json.load(f)
+    linhas, regressao = comparar_relatorios(baseline, atual, args.tolerancia)
+    print('\n'.join(linhas))
+    return 1 if regressao else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
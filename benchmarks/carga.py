@@ -0,0 +1,242 @@
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.semear import SENHA_PADRAO, email_usuario
+
+ROTAS_FUNIL = ['index', 'produto', 'calcular_preco', 'adicionar_carrinho', 'checkout', 'pedidos']
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+class ClienteFlask:
+    """Cliente que chama a aplicação em processo pelo test client do Flask."""
+
+    def __init__(self, app):
+        self._cliente = app.test_client()
+
+    def get(self, caminho):
+        resposta = self._cliente.get(caminho)
+        return resposta.status_code, resposta.get_data(as_text=True), resposta.headers.get('Location')
+
+    def post(self, caminho, dados=None, json_=None):
+        resposta = self._cliente.post(caminho, data=dados, json=json_)
+        return resposta.status_code, resposta.get_data(as_text=True), resposta.headers.get('Location')
+
+
+class ClienteHTTP:
+    """Cliente HTTP com cookies próprios, para um gunicorn local.
+
+    Os cookies são reenviados mesmo marcados como Secure, já que o servidor
+    local responde em HTTP puro.
+    """
+
+    def __init__(self, url):
+        partes = urlsplit(url)
+        self._conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+        self._cookies = {}
+
+    def _requisitar(self, metodo, caminho, corpo=None, cabecalhos=None):
+        cabecalhos = dict(cabecalhos or {})
+        if self._cookies:
+            cabecalhos['Cookie'] = '; '.join(f'{nome}={valor}' for nome, valor in self._cookies.items())
+        self._conexao.request(metodo, caminho, body=corpo, headers=cabecalhos)
+        resposta = self._conexao.getresponse()
+        conteudo = resposta.read().decode('utf-8', 'replace')
+        for cabecalho in resposta.headers.get_all('Set-Cookie') or []:
+            for nome, morsel in SimpleCookie(cabecalho).items():
+                self._cookies[nome] = morsel.value
+        return resposta.status, conteudo, resposta.getheader('Location')
+
+    def get(self, caminho):
+        return self._requisitar('GET', caminho)
+
+    def post(self, caminho, dados=None, json_=None):
+        if json_ is not None:
+            return self._requisitar('POST', caminho, json.dumps(json_), {'Content-Type': 'application/json'})
+        return self._requisitar('POST', caminho, urlencode(dados or {}),
+                                {'Content-Type': 'application/x-www-form-urlencoded'})
+
+
+class Amostras:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.erros = {}
+
+    def registrar(self, rota, inicio, erro):
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.latencias.setdefault(rota, []).append(duracao_ms)
+            if erro:
+                self.erros[rota] = self.erros.get(rota, 0) + 1
+
+
+class UsuarioVirtual(threading.Thread):
+    """Percorre o funil navegar → personalizar → carrinho → checkout → pedidos."""
+
+    def __init__(self, cliente, usuario_id, produto_ids, material_ids, pedra_ids, tamanhos,
+                 amostras, fim, semente):
+        super().__init__(daemon=True)
+        self.cliente = cliente
+        self.usuario_id = usuario_id
+        self.produto_ids = produto_ids
+        self.material_ids = material_ids
+        self.pedra_ids = pedra_ids
+        self.tamanhos = tamanhos
+        self.amostras = amostras
+        self.fim = fim
+        self.aleatorio = random.Random(semente)
+
+    def _medir(self, rota, chamada, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            status, corpo, destino = chamada(*args, **kwargs)
+        except Exception:
+            status, corpo, destino = 599, '', None
+        # Sem sessão, as rotas do funil respondem com um 302 rápido para o
+        # login; contar isso como sucesso mediria só o redirecionamento.
+        erro = status >= 400 or _para_login(destino)
+        self.amostras.registrar(rota, inicio, erro)
+        return status, corpo, destino
+
+    def entrar(self):
+        """Faz login e diz se deu certo: o POST tem de redirecionar para fora
+        de /login (com senha errada ou CSRF ausente a página volta com 200)."""
+        _, pagina, _ = self.cliente.get('/login')
+        token = CSRF_RE.search(pagina)
+        inicio = time.perf_counter()
+        try:
+            status, _, destino = self.cliente.post('/login', dados={
+                'csrf_token': token.group(1) if token else '',
+                'email': email_usuario(self.usuario_id),
+                'senha': SENHA_PADRAO,
+                'remember_me': 'false',
+            })
+        except Exception:
+            status, destino = 599, None
+        sucesso = status in (301, 302, 303) and destino is not None and not _para_login(destino)
+        self.amostras.registrar('login', inicio, not sucesso)
+        return sucesso
+
+    def run(self):
+        if not self.entrar():
+            return
+        while time.monotonic() < self.fim:
+            produto_id = self.aleatorio.choice(self.produto_ids)
+            material_id = self.aleatorio.choice(self.material_ids)
+            pedra_id = self.aleatorio.choice(self.pedra_ids)
+
+            self._medir('index', self.cliente.get, '/')
+            self._medir('produto', self.cliente.get, f'/produto/{produto_id}')
+            self._medir('calcular_preco', self.cliente.post, '/calcular_preco', json_={
+                'produto_id': produto_id, 'material_id': material_id, 'pedra_id': pedra_id
+            })
+            self._medir('adicionar_carrinho', self.cliente.post, '/adicionar_carrinho', json_={
+                'produto_id': produto_id,
+                'quantidade': self.aleatorio.randint(1, 3),
+                'tamanho': self.aleatorio.choice(self.tamanhos),
+                'material_id': material_id,
+                'pedra_id': pedra_id,
+            })
+            self._medir('checkout', self.cliente.post, '/checkout', dados={
+                'metodo_pagamento': 'pix', 'chave_idempotencia': uuid.uuid4().hex
+            })
+            self._medir('pedidos', self.cliente.get, '/pedidos')
+
+
+def _para_login(destino):
+    return destino is not None and urlsplit(destino).path.rstrip('/') == '/login'
+
+
+def percentil(ordenadas, p):
+    if not ordenadas:
+        return 0.0
+    indice = min(len(ordenadas) - 1, max(0, round(p / 100 * len(ordenadas) + 0.5) - 1))
+    return ordenadas[indice]
+
+
+def executar(app, usuarios_virtuais, duracao, url=None, semente=42):
+    """Executa o funil com usuários virtuais concorrentes e devolve o relatório.
+
+    Sem `url` a aplicação é chamada em processo; com `url` as requisições vão
+    para um servidor local (o servidor deve estar com o rate limit desligado).
+    """
+    from models import db, User, Produto, Material, Pedra, Tamanho
+
+    with app.app_context():
+        produto_ids = [id for id, in db.session.query(Produto.id).filter_by(ativo=True)]
+        material_ids = [id for id, in db.session.query(Material.id)]
+        pedra_ids = [id for id, in db.session.query(Pedra.id)]
+        tamanhos = [tamanho for tamanho, in db.session.query(Tamanho.tamanho)]
+        usuario_ids = [id for id, in db.session.query(User.id).filter(User.email.like('%@bench.lume'))
+                       .order_by(User.id).limit(usuarios_virtuais)]
+
+    if len(usuario_ids) < usuarios_virtuais:
+        raise SystemExit('Usuários de benchmark insuficientes; rode "semear" com mais --usuarios.')
+
+    amostras = Amostras()
+    fim = time.monotonic() + duracao
+    usuarios = [
+        UsuarioVirtual(ClienteHTTP(url) if url else ClienteFlask(app), usuario_id, produto_ids, material_ids,
+                       pedra_ids, tamanhos, amostras, fim, semente + indice)
+        for indice, usuario_id in enumerate(usuario_ids)
+    ]
+
+    inicio = time.perf_counter()
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    decorrido = time.perf_counter() - inicio
+
+    rotas = {}
+    for rota in ['login'] + ROTAS_FUNIL:
+        latencias = sorted(amostras.latencias.get(rota, []))
+        rotas[rota] = {
+            'requisicoes': len(latencias),
+            'erros': amostras.erros.get(rota, 0),
+            'vazao_rps': len(latencias) / decorrido if decorrido else 0.0,
+            'media_ms': sum(latencias) / len(latencias) if latencias else 0.0,
+            'p50_ms': percentil(latencias, 50),
+            'p90_ms': percentil(latencias, 90),
+            'p95_ms': percentil(latencias, 95),
+            'p99_ms': percentil(latencias, 99),
+            'maximo_ms': latencias[-1] if latencias else 0.0,
+        }
+
+    return {
+        'parametros': {
+            'usuarios_virtuais': usuarios_virtuais,
+            'duracao_s': duracao,
+            'alvo': url or 'test_client',
+            'semente': semente,
+        },
+        'decorrido_s': decorrido,
+        'rotas': rotas,
+    }
+
+
+def comparar(baseline, atual, tolerancia):
+    """Compara p95 e vazão por rota; devolve as linhas do relatório e se houve regressão."""
+    linhas = [f'{"rota":<20}{"p95 base":>12}{"p95 atual":>12}{"Δ p95":>10}{"rps base":>12}{"rps atual":>12}{"Δ rps":>10}']
+    regressao = False
+    for rota, dados in atual['rotas'].items():
+        base = baseline['rotas'].get(rota)
+        if not base or not base['requisicoes'] or not dados['requisicoes']:
+            continue
+        delta_p95 = (dados['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0.0
+        delta_rps = (dados['vazao_rps'] - base['vazao_rps']) / base['vazao_rps'] * 100 if base['vazao_rps'] else 0.0
+        marca = ''
+        if delta_p95 > tolerancia or delta_rps < -tolerancia:
+            regressao = True
+            marca = '  ← regressão'
+        linhas.append(f'{rota:<20}{base["p95_ms"]:>10.1f}ms{dados["p95_ms"]:>10.1f}ms{delta_p95:>+9.1f}%'
+                      f'{base["vazao_rps"]:>12.1f}{dados["vazao_rps"]:>12.1f}{delta_rps:>+9.1f}%{marca}')
+    return linhas, regressao
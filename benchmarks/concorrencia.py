@@ -0,0 +1,115 @@
+import multiprocessing
+import random
+import sqlite3
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import carregar_app
+from benchmarks.carga import percentil
+from benchmarks.semear import SENHA_PADRAO, email_usuario
+
+# 'antes' reproduz as conexões sem ajustes: journal de rollback, nenhum PRAGMA
+# (synchronous=FULL e só a espera padrão do driver sqlite3) e o pool padrão do
+# SQLAlchemy; 'depois' é a configuração padrão atual.
+CENARIOS = {
+    'antes': {'journal_mode': 'DELETE', 'config': {
+        'SQLITE_WAL': False, 'SQLITE_SYNCHRONOUS': None, 'SQLITE_BUSY_TIMEOUT_MS': None,
+        'DB_POOL_PRE_PING': False, 'DB_POOL_RECYCLE': -1,
+    }},
+    'depois': {'journal_mode': 'WAL', 'config': {}},
+}
+
+
+def _processo(app, usuario_id, produto_ids, fracao_escrita, duracao, semente, barreira, fila):
+    """Um worker: lê /pedidos e alterna favoritos até o fim da janela."""
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'email': email_usuario(usuario_id), 'senha': SENHA_PADRAO})
+    aleatorio = random.Random(semente)
+    latencias = {'leitura': [], 'escrita': []}
+    erros = {'leitura': 0, 'escrita': 0}
+
+    barreira.wait()
+    if resposta.status_code != 302 or urlsplit(resposta.headers.get('Location', '')).path == '/login':
+        # Sem sessão, cada requisição seria um redirecionamento rápido para o
+        # login, medido como se fosse leitura ou escrita.
+        fila.put((latencias, erros, False))
+        return
+    fim = time.monotonic() + duracao
+    while time.monotonic() < fim:
+        tipo = 'escrita' if aleatorio.random() < fracao_escrita else 'leitura'
+        inicio = time.perf_counter()
+        try:
+            if tipo == 'escrita':
+                status = cliente.post(f'/favoritar/{aleatorio.choice(produto_ids)}').status_code
+            else:
+                status = cliente.get('/pedidos').status_code
+        except Exception:
+            status = 599
+        # As duas rotas respondem 200; um 302 é o redirecionamento para o login.
+        if status != 200:
+            erros[tipo] += 1
+        else:
+            latencias[tipo].append((time.perf_counter() - inicio) * 1000)
+    fila.put((latencias, erros, True))
+
+
+def medir(banco, processos, duracao, fracao_escrita=0.2, semente=42):
+    """Vazão e latência de leituras e escritas misturadas, com `processos`
+    workers concorrentes no mesmo arquivo SQLite, antes e depois dos ajustes
+    de WAL/synchronous. Os erros contados são principalmente 'database is
+    locked'."""
+    from models import db, Produto, User
+
+    resultados = {}
+    for nome, cenario in CENARIOS.items():
+        conexao = sqlite3.connect(banco)
+        conexao.execute(f"PRAGMA journal_mode={cenario['journal_mode']}")
+        conexao.close()
+
+        app = carregar_app(banco, WTF_CSRF_ENABLED=False, SESSION_COOKIE_SECURE=False, **cenario['config'])
+        with app.app_context():
+            produto_ids = [id for id, in db.session.query(Produto.id).filter_by(ativo=True).limit(500)]
+            usuario_ids = [id for id, in db.session.query(User.id).filter(User.email.like('%@bench.lume'))
+                           .order_by(User.id).limit(processos)]
+            db.session.remove()
+        if len(usuario_ids) < processos:
+            raise SystemExit('Usuários de benchmark insuficientes; rode "semear" com mais --usuarios.')
+
+        contexto = multiprocessing.get_context('fork')
+        barreira = contexto.Barrier(processos)
+        fila = contexto.Queue()
+        filhos = [
+            contexto.Process(target=_processo, args=(app, usuario_id, produto_ids, fracao_escrita, duracao,
+                                                     semente + indice, barreira, fila))
+            for indice, usuario_id in enumerate(usuario_ids)
+        ]
+        for filho in filhos:
+            filho.start()
+        parciais = [fila.get() for _ in filhos]
+        for filho in filhos:
+            filho.join()
+
+        tipos = {}
+        for tipo in ('leitura', 'escrita'):
+            latencias = sorted(ms for parcial, _, _ in parciais for ms in parcial[tipo])
+            tipos[tipo] = {
+                'requisicoes': len(latencias),
+                'erros': sum(erros[tipo] for _, erros, _ in parciais),
+                'vazao_rps': len(latencias) / duracao,
+                'p50_ms': percentil(latencias, 50),
+                'p95_ms': percentil(latencias, 95),
+                'p99_ms': percentil(latencias, 99),
+            }
+        tipos['total_rps'] = tipos['leitura']['vazao_rps'] + tipos['escrita']['vazao_rps']
+        tipos['falhas_login'] = sum(1 for _, _, entrou in parciais if not entrou)
+        resultados[nome] = tipos
+
+    return {
+        'parametros': {'processos': processos, 'duracao_s': duracao, 'fracao_escrita': fracao_escrita},
+        'cenarios': resultados,
+    }
@@ -0,0 +1,115 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Caminho antigo: importar app.py criava a aplicação e rodava init_db (create_all
+# e as consultas da semente) em todo worker, sem aquecer caches.
+SCRIPT_ANTES = '''
+import json, time, warnings
+warnings.simplefilter('ignore')
+inicio = time.perf_counter()
+from app import create_app
+from banco import criar_tabelas, semear_dados_iniciais
+app = create_app()
+with app.app_context():
+    criar_tabelas()
+    semear_dados_iniciais()
+importado = time.perf_counter()
+resposta = app.test_client().get('/')
+respondido = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'primeira_requisicao_ms': (respondido - importado) * 1000,
+    'total_ms': (respondido - inicio) * 1000,
+    'status': resposta.status_code,
+}))
+'''
+
+SCRIPT = '''
+import json, time, warnings
+warnings.simplefilter('ignore')
+inicio = time.perf_counter()
+from app import create_app, aquecer
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+aquecer(app)
+aquecido = time.perf_counter()
+resposta = app.test_client().get('/')
+respondido = time.perf_counter()
+
+# Worker reciclado a partir de um mestre pré-carregado (gunicorn --preload).
+import os
+from models import db
+leitura, escrita = os.pipe()
+bifurcado = time.perf_counter()
+pid = os.fork()
+if pid == 0:
+    with app.app_context():
+        db.engine.dispose(close=False)
+    app.test_client().get('/')
+    os.write(escrita, str((time.perf_counter() - bifurcado) * 1000).encode())
+    os._exit(0)
+os.close(escrita)
+worker_preload_ms = float(os.read(leitura, 64))
+os.waitpid(pid, 0)
+
+print(json.dumps({
+    'import_ms': (importado - inicio) * 1000,
+    'create_app_ms': (criado - importado) * 1000,
+    'aquecer_ms': (aquecido - criado) * 1000,
+    'primeira_requisicao_ms': (respondido - aquecido) * 1000,
+    'total_ms': (respondido - inicio) * 1000,
+    'worker_preload_ms': worker_preload_ms,
+    'status': resposta.status_code,
+}))
+'''
+
+
+def _amostrar(script, ambiente, raiz, repeticoes):
+    amostras = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', script], env=ambiente, cwd=raiz,
+                               capture_output=True, text=True, check=True)
+        amostras.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+    return amostras
+
+
+def _resumo(amostras, campos):
+    return {
+        'mediana': {campo: statistics.median(a[campo] for a in amostras) for campo in campos},
+        'minimo': {campo: min(a[campo] for a in amostras) for campo in campos},
+        'status': sorted({a['status'] for a in amostras}),
+    }
+
+
+def medir(banco, repeticoes):
+    """Mede, em processos novos, o tempo até a aplicação responder a primeira requisição.
+
+    Cada repetição simula a subida de um worker sem --preload (importar o
+    módulo, criar a aplicação, aquecer os caches e atender a página inicial) e,
+    em `worker_preload_ms`, a reciclagem de um worker bifurcado a partir de um
+    mestre já aquecido. 'antes' repete a subida antiga, com create_all e a
+    semente no import, sobre o mesmo banco; `reducao_total_pct` compara os
+    totais medianos dos dois caminhos.
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ambiente = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.abspath(banco),
+                    PYTHONPATH=os.pathsep.join(filter(None, [raiz, os.environ.get('PYTHONPATH')])))
+
+    antes = _resumo(_amostrar(SCRIPT_ANTES, ambiente, raiz, repeticoes),
+                    ['import_ms', 'primeira_requisicao_ms', 'total_ms'])
+    depois = _resumo(_amostrar(SCRIPT, ambiente, raiz, repeticoes),
+                     ['import_ms', 'create_app_ms', 'aquecer_ms', 'primeira_requisicao_ms', 'total_ms',
+                      'worker_preload_ms'])
+    total_antes = antes['mediana']['total_ms']
+    return {
+        'repeticoes': repeticoes,
+        'antes': antes,
+        'depois': depois,
+        'reducao_total_pct': (total_antes - depois['mediana']['total_ms']) / total_antes * 100,
+        'reducao_worker_preload_pct': (total_antes - depois['mediana']['worker_preload_ms']) / total_antes * 100,
+    }
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+
+from flask import Flask
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+
+import limitador
+
+
+def _app(config):
+    app = Flask('benchmark_limitador')
+    app.config.update(
+        RATELIMIT_DEFAULT='1000000 per day;1000000 per hour',
+        RATELIMIT_STRATEGY='sliding-window-counter',
+        **config
+    )
+    Limiter(key_func=get_remote_address, app=app)
+
+    @app.route('/')
+    def raiz():
+        return ''
+    return app
+
+
+def medir(requisicoes=20000, clientes=1000):
+    """Custo do limitador por requisição, descontado o de uma aplicação sem
+    limite, com os mesmos limites padrão da loja e `clientes` IPs distintos.
+
+    'sqlite_sem_lote' sincroniza a cada verificação (uma ida ao arquivo por
+    requisição), para mostrar o que o lote local economiza.
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        uri = f'{limitador.ESQUEMA}://{os.path.join(pasta, "limites.db")}'
+        cenarios = {
+            'sem_limite': {'RATELIMIT_ENABLED': False},
+            'memoria': {'RATELIMIT_STORAGE_URI': 'memory://'},
+            'sqlite_em_lote': {'RATELIMIT_STORAGE_URI': uri,
+                               'RATELIMIT_STORAGE_OPTIONS': {'intervalo': 0.5, 'lote': 100}},
+            'sqlite_sem_lote': {'RATELIMIT_STORAGE_URI': uri.replace('limites.db', 'sem_lote.db'),
+                                'RATELIMIT_STORAGE_OPTIONS': {'intervalo': 0, 'lote': 1}},
+        }
+
+        resultados = {}
+        for nome, config in cenarios.items():
+            cliente = _app(config).test_client()
+            ambientes = [{'REMOTE_ADDR': f'10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}'} for i in range(clientes)]
+            for ambiente in ambientes:
+                cliente.get('/', environ_base=ambiente)
+
+            inicio = time.perf_counter()
+            for indice in range(requisicoes):
+                cliente.get('/', environ_base=ambientes[indice % clientes])
+            resultados[nome] = {'us_por_requisicao': (time.perf_counter() - inicio) / requisicoes * 1e6}
+
+    base = resultados['sem_limite']['us_por_requisicao']
+    for resultado in resultados.values():
+        resultado['sobrecusto_us'] = resultado['us_por_requisicao'] - base
+    return {'requisicoes': requisicoes, 'clientes': clientes, 'cenarios': resultados}
@@ -0,0 +1,144 @@
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert, select, text
+
+SENHA_PADRAO = 'senha123'
+LOTE = 20000
+
+
+def email_usuario(indice):
+    return f'usuario{indice}@bench.lume'
+
+
+def semear(app, produtos, usuarios, pedidos, avaliacoes, dias=365, semente=42):
+    """Popula o banco com inserts em lote diretamente pelos modelos.
+
+    Usa uma semente fixa para que duas execuções gerem o mesmo conjunto de
+    dados, e um único hash de senha para todos os usuários.
+    """
+    from models import db, User, Produto, Material, Pedra, Tamanho, Pedido, ItemPedido, Avaliacao
+    from avaliacoes import reconstruir_resumos
+    from vendas import reconstruir_vendas
+    from catalogo import catalogo
+    import busca
+    from senhas import senhas
+
+    aleatorio = random.Random(semente)
+    agora = datetime.utcnow()
+
+    def data_aleatoria():
+        return agora - timedelta(seconds=aleatorio.randrange(dias * 86400))
+
+    def inserir(tabela, linhas):
+        for inicio in range(0, len(linhas), LOTE):
+            db.session.execute(insert(tabela), linhas[inicio:inicio + LOTE])
+
+    def proximo_id(modelo):
+        return (db.session.scalar(select(func.max(modelo.id))) or 0) + 1
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute(text('PRAGMA synchronous=OFF'))
+
+        inicio = time.perf_counter()
+        materiais = Material.query.all()
+        pedras = Pedra.query.all()
+        tamanhos = [t.tamanho for t in Tamanho.query.all()]
+
+        primeiro_produto = proximo_id(Produto)
+        inserir(Produto.__table__, [
+            {
+                'id': primeiro_produto + i,
+                'nome': f'Anel Solitário {primeiro_produto + i}',
+                'descricao': f'Anel de benchmark número {primeiro_produto + i}, com acabamento polido e pedra central.',
+                'preco_base': aleatorio.randrange(100000, 900000) / 100,
+                'imagem_url': '/static/imgs/logo.png',
+                'ativo': aleatorio.random() > 0.05,
+                'created_at': data_aleatoria(),
+            }
+            for i in range(produtos)
+        ])
+        produto_ids = [id for id, in db.session.execute(select(Produto.id))]
+        precos = dict(db.session.execute(select(Produto.id, Produto.preco_base)).all())
+        db.session.commit()
+
+        senha_hash = senhas.gerar_hash(SENHA_PADRAO)
+        primeiro_usuario = proximo_id(User)
+        inserir(User.__table__, [
+            {
+                'id': primeiro_usuario + i,
+                'nome': f'Usuário {primeiro_usuario + i}',
+                'email': email_usuario(primeiro_usuario + i),
+                'senha_hash': senha_hash,
+                'is_admin': False,
+                'created_at': data_aleatoria(),
+            }
+            for i in range(usuarios)
+        ])
+        usuario_ids = range(primeiro_usuario, primeiro_usuario + usuarios)
+        db.session.commit()
+
+        proximo_pedido = proximo_id(Pedido)
+        restantes = pedidos
+        while restantes > 0:
+            quantidade = min(LOTE, restantes)
+            linhas_pedido = []
+            linhas_item = []
+            for pedido_id in range(proximo_pedido, proximo_pedido + quantidade):
+                total = 0
+                for _ in range(aleatorio.randint(1, 3)):
+                    produto_id = aleatorio.choice(produto_ids)
+                    material = aleatorio.choice(materiais)
+                    pedra = aleatorio.choice(pedras)
+                    unidades = aleatorio.randint(1, 3)
+                    unitario = precos[produto_id] + material.preco_adicional + pedra.preco_adicional
+                    total += unitario * unidades
+                    linhas_item.append({
+                        'pedido_id': pedido_id,
+                        'produto_id': produto_id,
+                        'quantidade': unidades,
+                        'tamanho': aleatorio.choice(tamanhos),
+                        'material': material.nome,
+                        'pedra': pedra.nome,
+                        'preco_unitario': unitario,
+                        'subtotal': unitario * unidades,
+                    })
+                linhas_pedido.append({
+                    'id': pedido_id,
+                    'usuario_id': aleatorio.choice(usuario_ids),
+                    'status': aleatorio.choice(['pendente', 'processando', 'enviado', 'entregue', 'cancelado']),
+                    'total': total,
+                    'metodo_pagamento': aleatorio.choice(['pix', 'cartao', 'boleto']),
+                    'created_at': data_aleatoria(),
+                })
+            inserir(Pedido.__table__, linhas_pedido)
+            inserir(ItemPedido.__table__, linhas_item)
+            db.session.commit()
+            proximo_pedido += quantidade
+            restantes -= quantidade
+
+        restantes = avaliacoes
+        while restantes > 0:
+            quantidade = min(LOTE, restantes)
+            inserir(Avaliacao.__table__, [
+                {
+                    'produto_id': aleatorio.choice(produto_ids),
+                    'usuario_id': aleatorio.choice(usuario_ids),
+                    'nota': aleatorio.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 4, 6])[0],
+                    'comentario': 'Avaliação gerada pelo benchmark.',
+                    'created_at': data_aleatoria(),
+                }
+                for _ in range(quantidade)
+            ])
+            db.session.commit()
+            restantes -= quantidade
+
+        reconstruir_resumos()
+        reconstruir_vendas()
+        indice = busca.backend_atual()
+        indice.criar_indice()
+        indice.reconstruir()
+        db.session.commit()
+        catalogo.invalidar()
+        return time.perf_counter() - inicio
@@ -0,0 +1,35 @@
+import statistics
+import time
+from werkzeug.security import generate_password_hash, check_password_hash
+
+METODOS_PADRAO = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+]
+
+
+def medir(metodos=None, repeticoes=5, senha='senha123'):
+    """Mede o custo de gerar e verificar um hash para cada conjunto de parâmetros.
+
+    O valor de cada método é o tempo que uma requisição de login ou cadastro
+    passa esperando o hash, e serve para escolher SENHA_METODO.
+    """
+    resultados = {}
+    for metodo in metodos or METODOS_PADRAO:
+        gerar, verificar = [], []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            senha_hash = generate_password_hash(senha, metodo)
+            gerado = time.perf_counter()
+            check_password_hash(senha_hash, senha)
+            verificado = time.perf_counter()
+            gerar.append((gerado - inicio) * 1000)
+            verificar.append((verificado - gerado) * 1000)
+        resultados[metodo] = {
+            'gerar_ms': statistics.median(gerar),
+            'verificar_ms': statistics.median(verificar),
+            'logins_por_segundo_por_nucleo': 1000 / statistics.median(verificar),
+        }
+    return {'repeticoes': repeticoes, 'metodos': resultados}
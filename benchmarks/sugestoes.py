@@ -0,0 +1,84 @@
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import insert, text
+
+from benchmarks import carregar_app
+from benchmarks.carga import percentil
+
+TIPOS = ['Anel', 'Aliança', 'Colar', 'Brinco', 'Pulseira', 'Pingente', 'Gargantilha', 'Tornozeleira']
+MATERIAIS = ['Ouro', 'Ouro Branco', 'Ouro Rosé', 'Prata', 'Platina']
+PEDRAS = ['Diamante', 'Esmeralda', 'Rubi', 'Safira', 'Topázio', 'Ametista', 'Turmalina', 'Pérola']
+ESTILOS = ['Solitário', 'Clássico', 'Delicado', 'Vintage', 'Cravejado', 'Minimalista', 'Trançado']
+
+# Do prefixo de duas letras, o mais caro, à frase quase completa.
+PREFIXOS = ['an', 'al', 'co', 'pu', 'ane', 'col', 'anel', 'esm', 'rub', 'saf', 'pla',
+            'anel o', 'anel ouro', 'colar pra', 'brinco rubi cl', 'pulseira platina del']
+LOTE = 20000
+
+
+def _semear(app, produtos, semente):
+    from models import db, Produto
+    import busca
+
+    aleatorio = random.Random(semente)
+    with app.app_context():
+        db.session.execute(text('PRAGMA synchronous=OFF'))
+        linhas = [
+            {
+                'nome': (f'{aleatorio.choice(TIPOS)} {aleatorio.choice(MATERIAIS)} '
+                         f'{aleatorio.choice(PEDRAS)} {aleatorio.choice(ESTILOS)} {indice}'),
+                'descricao': 'Joia de benchmark do autocompletar.',
+                'preco_base': aleatorio.randrange(100000, 900000) / 100,
+                'imagem_url': '/static/imgs/logo.png',
+                'ativo': aleatorio.random() > 0.05,
+            }
+            for indice in range(produtos)
+        ]
+        for inicio in range(0, len(linhas), LOTE):
+            db.session.execute(insert(Produto.__table__), linhas[inicio:inicio + LOTE])
+        busca.backend_atual().reconstruir()
+        db.session.commit()
+
+
+def medir(produtos=100000, repeticoes=50, semente=42):
+    """Latência de `sugerir` com `produtos` produtos num banco descartável.
+
+    Cada prefixo de PREFIXOS é consultado `repeticoes` vezes, depois de uma
+    rodada de aquecimento; o requisito é um p95 de poucos milissegundos.
+    """
+    import busca
+
+    with tempfile.TemporaryDirectory() as pasta:
+        app = carregar_app(os.path.join(pasta, 'sugestoes.db'))
+        _semear(app, produtos, semente)
+
+        with app.app_context():
+            backend = busca.backend_atual()
+            for prefixo in PREFIXOS:
+                backend.sugerir(prefixo)
+
+            latencias = []
+            por_prefixo = {}
+            for prefixo in PREFIXOS:
+                medidas = []
+                for _ in range(repeticoes):
+                    inicio = time.perf_counter()
+                    backend.sugerir(prefixo)
+                    medidas.append((time.perf_counter() - inicio) * 1000)
+                medidas.sort()
+                por_prefixo[prefixo] = {'p50_ms': percentil(medidas, 50), 'p95_ms': percentil(medidas, 95)}
+                latencias.extend(medidas)
+
+    latencias.sort()
+    return {
+        'backend': type(backend).__name__,
+        'produtos': produtos,
+        'consultas': len(latencias),
+        'p50_ms': percentil(latencias, 50),
+        'p95_ms': percentil(latencias, 95),
+        'max_ms': latencias[-1],
+        'por_prefixo': por_prefixo,
+    }
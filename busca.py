@@ -0,0 +1,216 @@
+import re
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, func, literal_column, or_, select, text
+from sqlalchemy.engine import make_url
+from models import db, Produto
+from paginacao import Pagina
+
+Sugestao = namedtuple('Sugestao', 'id nome')
+
+PALAVRA_RE = re.compile(r'\w+', re.UNICODE)
+MAX_PALAVRAS = 8
+MAX_RESULTADOS = 1000
+CANDIDATOS_SUGESTAO = 200
+
+# Índice FTS5 fora de db.metadata, para que create_all não o crie como tabela comum.
+_indice = Table(
+    'produto_busca', MetaData(),
+    Column('rowid', Integer, key='rowid'),
+    Column('nome', Text),
+    Column('descricao', Text),
+)
+
+
+def palavras(termo):
+    return PALAVRA_RE.findall((termo or '').lower())[:MAX_PALAVRAS]
+
+
+def _literal_like(texto):
+    """Escapa os curingas do LIKE; `_` passa pelo PALAVRA_RE."""
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class Busca:
+    """Interface dos backends de busca do catálogo."""
+
+    tabela = None
+
+    def pagina(self, termo, preco_min=None, preco_max=None, inicio=0, limite=20):
+        """Página de resultados; o cursor é o deslocamento da próxima página,
+        limitado a MAX_RESULTADOS já que a ordem é por relevância. O `inicio`
+        recebido também é limitado, para que um cursor forjado não gere um
+        OFFSET arbitrariamente grande."""
+        inicio = min(max(inicio, 0), MAX_RESULTADOS)
+        itens = self.buscar(termo, preco_min, preco_max, True, inicio, limite + 1)
+        proximo_cursor = None
+        if len(itens) > limite:
+            itens = itens[:limite]
+            if inicio + limite < MAX_RESULTADOS:
+                proximo_cursor = str(inicio + limite)
+        return Pagina(itens, proximo_cursor)
+
+    def criar_indice(self):
+        pass
+
+    def indexar(self, produto):
+        pass
+
+    def remover(self, produto_id):
+        pass
+
+    def reconstruir(self):
+        return 0
+
+    def buscar(self, termo, preco_min=None, preco_max=None, somente_ativos=True, inicio=0, limite=20):
+        raise NotImplementedError
+
+    def sugerir(self, termo, limite=8):
+        raise NotImplementedError
+
+
+def _filtros(preco_min, preco_max, somente_ativos):
+    filtros = []
+    if somente_ativos:
+        filtros.append(Produto.ativo.is_(True))
+    if preco_min is not None:
+        filtros.append(Produto.preco_base >= preco_min)
+    if preco_max is not None:
+        filtros.append(Produto.preco_base <= preco_max)
+    return filtros
+
+
+class FTS5Busca(Busca):
+    """Busca no SQLite com uma tabela virtual FTS5, ordenada por bm25.
+
+    O nome pesa dez vezes mais que a descrição; a última palavra vale como
+    prefixo, e o índice de prefixos de 2 e 3 letras atende o autocompletar
+    sem varrer o vocabulário.
+    """
+
+    tabela = 'produto_busca'
+
+    # Envolver `ativo` numa função impede o SQLite de começar o join pelo índice
+    # de produto.ativo e consultar o FTS uma vez por produto ativo.
+    ativo = func.coalesce(Produto.ativo, False).is_(True)
+
+    def criar_indice(self):
+        db.session.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS produto_busca USING fts5("
+            "nome, descricao, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+
+    def indexar(self, produto):
+        self.remover(produto.id)
+        db.session.execute(_indice.insert().values(rowid=produto.id, nome=produto.nome,
+                                                   descricao=produto.descricao or ''))
+
+    def remover(self, produto_id):
+        db.session.execute(_indice.delete().where(_indice.c.rowid == produto_id))
+
+    def reconstruir(self):
+        db.session.execute(_indice.delete())
+        resultado = db.session.execute(_indice.insert().from_select(
+            ['rowid', 'nome', 'descricao'],
+            select(Produto.id, Produto.nome, func.coalesce(Produto.descricao, ''))
+        ))
+        db.session.execute(text("INSERT INTO produto_busca(produto_busca) VALUES('optimize')"))
+        return resultado.rowcount
+
+    def _expressao(self, termo):
+        lista = palavras(termo)
+        if not lista:
+            return None
+        return ' '.join(f'"{palavra}"' for palavra in lista[:-1]) + f' "{lista[-1]}"*'
+
+    def buscar(self, termo, preco_min=None, preco_max=None, somente_ativos=True, inicio=0, limite=20):
+        expressao = self._expressao(termo)
+        if expressao is None:
+            return []
+        tabela = literal_column('produto_busca')
+        consulta = (
+            select(Produto)
+            .join(_indice, _indice.c.rowid == Produto.id)
+            .where(tabela.op('MATCH')(expressao), *_filtros(preco_min, preco_max, False))
+            .where(*([self.ativo] if somente_ativos else []))
+            .order_by(func.bm25(tabela, 10.0, 1.0), Produto.id)
+            .offset(inicio)
+            .limit(limite)
+        )
+        return db.session.scalars(consulta).all()
+
+    def sugerir(self, termo, limite=8):
+        expressao = self._expressao(termo)
+        if expressao is None:
+            return []
+        # Pontuar todos os casamentos de um prefixo curto custa dezenas de ms em
+        # 100 mil produtos; o bm25 ordena só os primeiros candidatos do índice,
+        # com desempate pelo nome.
+        tabela = literal_column('produto_busca')
+        candidatos = (
+            select(_indice.c.rowid, func.bm25(tabela, 10.0, 1.0).label('relevancia'))
+            .where(tabela.op('MATCH')(f'nome : ({expressao})'))
+            .limit(CANDIDATOS_SUGESTAO)
+            .subquery()
+        )
+        consulta = (
+            select(Produto.id, Produto.nome)
+            .join(candidatos, candidatos.c.rowid == Produto.id)
+            .where(self.ativo)
+            .order_by(candidatos.c.relevancia, Produto.nome)
+            .limit(limite)
+        )
+        return [Sugestao(*linha) for linha in db.session.execute(consulta)]
+
+
+class LikeBusca(Busca):
+    """Fallback para bancos sem FTS5: LIKE por palavra, nome antes de descrição."""
+
+    def buscar(self, termo, preco_min=None, preco_max=None, somente_ativos=True, inicio=0, limite=20):
+        lista = palavras(termo)
+        if not lista:
+            return []
+        padroes = [f'%{_literal_like(palavra)}%' for palavra in lista]
+        condicoes = [or_(Produto.nome.ilike(padrao, escape='\\'), Produto.descricao.ilike(padrao, escape='\\'))
+                     for padrao in padroes]
+        no_nome = and_(*[Produto.nome.ilike(padrao, escape='\\') for padrao in padroes])
+        consulta = (
+            select(Produto)
+            .where(*condicoes, *_filtros(preco_min, preco_max, somente_ativos))
+            .order_by(no_nome.desc(), Produto.created_at.desc(), Produto.id.desc())
+            .offset(inicio)
+            .limit(limite)
+        )
+        return db.session.scalars(consulta).all()
+
+    def sugerir(self, termo, limite=8):
+        termo = ' '.join(palavras(termo))
+        if not termo:
+            return []
+        consulta = (
+            select(Produto.id, Produto.nome)
+            .where(Produto.nome.ilike(f'{_literal_like(termo)}%', escape='\\'), Produto.ativo.is_(True))
+            .order_by(Produto.nome)
+            .limit(limite)
+        )
+        return [Sugestao(*linha) for linha in db.session.execute(consulta)]
+
+
+BACKENDS = {
+    'fts5': FTS5Busca,
+    'like': LikeBusca,
+}
+
+
+def init_app(app):
+    backend = app.config.get('BUSCA_BACKEND', 'auto')
+    if backend == 'auto':
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        backend = 'fts5' if url.get_backend_name() == 'sqlite' else 'like'
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend de busca desconhecido: {backend}')
+    app.extensions['busca'] = BACKENDS[backend]()
+
+
+def backend_atual():
+    return current_app.extensions['busca']
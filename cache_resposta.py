@@ -0,0 +1,231 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from urllib.parse import quote, unquote
+from flask import Response, make_response, request, session
+from werkzeug.datastructures import ImmutableMultiDict
+from flask_login import current_user
+from catalogo import VersaoCompartilhada
+
+Entrada = namedtuple('Entrada', 'corpo etag mimetype')
+
+
+class LRUStore:
+
+    def __init__(self, max_itens):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._itens.get(chave)
+            if entrada is not None:
+                self._itens.move_to_end(chave)
+            return entrada
+
+    def guardar(self, chave, entrada):
+        with self._lock:
+            self._itens[chave] = entrada
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+class DiscoStore:
+    """Respostas gravadas em arquivos, compartilhadas entre workers e reinícios.
+
+    Cada combinação de carimbos de versão tem seu subdiretório, nomeado pelas
+    dependências: invalidar uma dependência apaga os subdiretórios que a
+    usam, e a verificação periódica apaga os de versões que mudaram por
+    fora (como a do catálogo) e, acima de `max_itens` arquivos, os mais
+    antigos.
+    """
+
+    VERIFICAR_A_CADA = 100
+
+    def __init__(self, diretorio, max_itens=10000, versoes_atuais=None):
+        self.diretorio = diretorio
+        self.max_itens = max_itens
+        self.versoes_atuais = versoes_atuais
+        self._gravacoes = 0
+        os.makedirs(diretorio, exist_ok=True)
+
+    @staticmethod
+    def _grupo(versoes):
+        nomes = '+'.join(quote(nome, safe='') for nome, _ in versoes)
+        return f"{nomes}@{hashlib.sha256(repr(versoes).encode()).hexdigest()[:16]}"
+
+    @staticmethod
+    def _nomes(grupo):
+        return [unquote(nome) for nome in grupo.split('@', 1)[0].split('+')]
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, self._grupo(chave[-1]), hashlib.sha256(repr(chave).encode()).hexdigest())
+
+    def obter(self, chave):
+        try:
+            with open(self._caminho(chave), 'rb') as f:
+                etag, mimetype, corpo = f.read().split(b'\n', 2)
+        except (FileNotFoundError, ValueError):
+            return None
+        return Entrada(corpo, etag.decode(), mimetype.decode())
+
+    def guardar(self, chave, entrada):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f'{caminho}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporario, 'wb') as f:
+            f.write(entrada.etag.encode() + b'\n' + entrada.mimetype.encode() + b'\n' + entrada.corpo)
+        os.replace(temporario, caminho)
+        self._gravacoes += 1
+        if self._gravacoes % self.VERIFICAR_A_CADA == 1:
+            self._limitar()
+
+    def podar(self, nomes):
+        """Apaga as respostas que dependem de algum dos `nomes`."""
+        nomes = set(nomes)
+        for grupo in os.listdir(self.diretorio):
+            if nomes.intersection(self._nomes(grupo)):
+                shutil.rmtree(os.path.join(self.diretorio, grupo), ignore_errors=True)
+
+    def _limitar(self):
+        arquivos = []
+        for grupo in os.scandir(self.diretorio):
+            if not grupo.is_dir():
+                continue
+            if self.versoes_atuais is not None and grupo.name != self._grupo(self.versoes_atuais(self._nomes(grupo.name))):
+                shutil.rmtree(grupo.path, ignore_errors=True)
+            else:
+                arquivos.extend((arquivo.stat().st_mtime, arquivo.path) for arquivo in os.scandir(grupo.path)
+                                if '.' not in arquivo.name)
+        excesso = len(arquivos) - self.max_itens
+        if excesso <= 0:
+            return
+        # Remove um pouco além do limite para não repetir a varredura a cada gravação.
+        arquivos.sort()
+        for _, caminho in arquivos[:excesso + self.max_itens // 10]:
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+    def limpar(self):
+        for grupo in os.listdir(self.diretorio):
+            shutil.rmtree(os.path.join(self.diretorio, grupo), ignore_errors=True)
+
+
+class CacheResposta:
+    """Cache de páginas públicas para visitantes anônimos.
+
+    A chave combina rota, argumentos e os carimbos de versão dos quais a página
+    depende, então invalidar é só incrementar um carimbo: as entradas antigas
+    deixam de ser alcançadas e saem do LRU com o tempo.
+    """
+
+    def __init__(self, app=None):
+        self.memoria = LRUStore(512)
+        self.disco = None
+        self.max_age = 0
+        self._diretorio_versoes = None
+        self._versoes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.memoria = LRUStore(app.config.get('CACHE_RESPOSTA_MAX_ITENS', 512))
+        self.max_age = app.config.get('CACHE_RESPOSTA_MAX_AGE', 0)
+        diretorio = app.config.get('CACHE_RESPOSTA_DIR')
+        self.disco = None
+        if diretorio:
+            self.disco = DiscoStore(diretorio, app.config.get('CACHE_RESPOSTA_DISCO_MAX_ITENS', 10000), self._versoes_atuais)
+        self._diretorio_versoes = os.path.join(app.instance_path, 'versoes')
+        app.extensions['cache_resposta'] = self
+
+    def registrar_versao(self, nome, versao):
+        self._versoes[nome] = versao
+
+    def versao(self, nome):
+        versao = self._versoes.get(nome)
+        if versao is None:
+            versao = self._versoes.setdefault(nome, VersaoCompartilhada(os.path.join(self._diretorio_versoes, nome)))
+        return versao
+
+    def _versoes_atuais(self, nomes):
+        return tuple((nome, self.versao(nome).atual()) for nome in nomes)
+
+    def invalidar(self, *nomes):
+        for nome in nomes:
+            self.versao(nome).incrementar()
+        if self.disco is not None:
+            self.disco.podar(nomes)
+
+    def limpar(self):
+        self.memoria.limpar()
+        if self.disco is not None:
+            self.disco.limpar()
+
+    def cachear(self, *dependencias, parametros=()):
+        """Decora uma view GET pública; `dependencias` são nomes de versão,
+        formatados com os argumentos da rota (ex.: 'avaliacoes-{id}'), e
+        `parametros` os parâmetros da query string que a view usa. Os demais são
+        descartados antes da view rodar e não entram na chave, para que
+        `/?x=1`, `/?x=2`... não criem uma entrada cada.
+
+        Não combine com `somente_leitura`: a página montada com a réplica
+        atrasada ficaria guardada sob a versão nova até a próxima invalidação.
+        """
+
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if request.method not in ('GET', 'HEAD') or current_user.is_authenticated or session.get('_flashes'):
+                    return f(*args, **kwargs)
+
+                argumentos = sorted((k, v) for k, v in request.args.items(multi=True) if k in parametros)
+                request.args = ImmutableMultiDict(argumentos)
+                versoes = self._versoes_atuais([dependencia.format(**kwargs) for dependencia in dependencias])
+                chave = (request.endpoint, tuple(sorted(kwargs.items())), tuple(argumentos), versoes)
+
+                entrada = self._obter(chave)
+                if entrada is None:
+                    resposta = make_response(f(*args, **kwargs))
+                    if resposta.status_code != 200 or session.modified:
+                        return resposta
+                    corpo = resposta.get_data()
+                    entrada = Entrada(corpo, '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"', resposta.mimetype)
+                    self._guardar(chave, entrada)
+
+                if request.if_none_match.contains(entrada.etag.strip('"')):
+                    resposta = Response(status=304)
+                else:
+                    resposta = Response(entrada.corpo, mimetype=entrada.mimetype)
+                resposta.headers['ETag'] = entrada.etag
+                resposta.headers['Cache-Control'] = f'public, max-age={self.max_age}, must-revalidate'
+                resposta.vary.add('Cookie')
+                return resposta
+            return decorated_function
+        return decorator
+
+    def _obter(self, chave):
+        entrada = self.memoria.obter(chave)
+        if entrada is None and self.disco is not None:
+            entrada = self.disco.obter(chave)
+            if entrada is not None:
+                self.memoria.guardar(chave, entrada)
+        return entrada
+
+    def _guardar(self, chave, entrada):
+        self.memoria.guardar(chave, entrada)
+        if self.disco is not None:
+            self.disco.guardar(chave, entrada)
+
+
+cache_resposta = CacheResposta()
@@ -0,0 +1,236 @@
+import secrets
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app, session
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Carrinho, ItemCarrinho
+from precos import reais
+
+
+class LinhaCarrinho(namedtuple('LinhaCarrinho', 'id produto_id quantidade tamanho material_id material '
+                                                'pedra_id pedra preco_unitario_centavos')):
+    __slots__ = ()
+
+    @property
+    def subtotal_centavos(self):
+        return self.preco_unitario_centavos * self.quantidade
+
+    @property
+    def preco_unitario(self):
+        return reais(self.preco_unitario_centavos)
+
+    @property
+    def subtotal(self):
+        return reais(self.subtotal_centavos)
+
+
+ResumoCarrinho = namedtuple('ResumoCarrinho', 'quantidade_itens total_centavos')
+
+RESUMO_VAZIO = ResumoCarrinho(0, 0)
+
+
+class CarrinhoStore:
+    """Interface dos backends de carrinho.
+
+    Cada operação de item é O(1): o backend mantém a contagem de itens e o
+    total em centavos junto do carrinho, sem somar as linhas a cada leitura.
+    """
+
+    def itens(self, carrinho_id):
+        raise NotImplementedError
+
+    def resumo(self, carrinho_id):
+        raise NotImplementedError
+
+    def adicionar(self, carrinho_id, produto_id, quantidade, tamanho, material_id, material,
+                  pedra_id, pedra, preco_unitario_centavos):
+        raise NotImplementedError
+
+    def remover(self, carrinho_id, item_id):
+        raise NotImplementedError
+
+    def atualizar_quantidade(self, carrinho_id, item_id, quantidade):
+        raise NotImplementedError
+
+    def limpar(self, carrinho_id):
+        raise NotImplementedError
+
+
+class SQLCarrinhoStore(CarrinhoStore):
+
+    def itens(self, carrinho_id):
+        linhas = ItemCarrinho.query.filter_by(carrinho_id=carrinho_id).order_by(ItemCarrinho.id).all()
+        return [_linha(item) for item in linhas]
+
+    def resumo(self, carrinho_id):
+        carrinho = db.session.get(Carrinho, carrinho_id)
+        if carrinho is None:
+            return RESUMO_VAZIO
+        return ResumoCarrinho(carrinho.quantidade_itens, carrinho.total_centavos)
+
+    def adicionar(self, carrinho_id, produto_id, quantidade, tamanho, material_id, material,
+                  pedra_id, pedra, preco_unitario_centavos):
+        carrinho = db.session.get(Carrinho, carrinho_id) or self._criar(carrinho_id)
+
+        item = ItemCarrinho(
+            carrinho_id=carrinho_id,
+            produto_id=produto_id,
+            quantidade=quantidade,
+            tamanho=tamanho,
+            material_id=material_id,
+            material=material,
+            pedra_id=pedra_id,
+            pedra=pedra,
+            preco_unitario_centavos=preco_unitario_centavos
+        )
+        db.session.add(item)
+        self._ajustar(carrinho, 1, preco_unitario_centavos * quantidade)
+        db.session.commit()
+        return item.id, ResumoCarrinho(carrinho.quantidade_itens, carrinho.total_centavos)
+
+    def remover(self, carrinho_id, item_id):
+        item = db.session.get(ItemCarrinho, item_id)
+        if item is None or item.carrinho_id != carrinho_id:
+            return None
+
+        carrinho = db.session.get(Carrinho, carrinho_id)
+        self._ajustar(carrinho, -1, -item.preco_unitario_centavos * item.quantidade)
+        db.session.delete(item)
+        db.session.commit()
+        return ResumoCarrinho(carrinho.quantidade_itens, carrinho.total_centavos)
+
+    def atualizar_quantidade(self, carrinho_id, item_id, quantidade):
+        item = db.session.get(ItemCarrinho, item_id)
+        if item is None or item.carrinho_id != carrinho_id:
+            return None
+
+        carrinho = db.session.get(Carrinho, carrinho_id)
+        self._ajustar(carrinho, 0, item.preco_unitario_centavos * (quantidade - item.quantidade))
+        item.quantidade = quantidade
+        db.session.commit()
+        return ResumoCarrinho(carrinho.quantidade_itens, carrinho.total_centavos)
+
+    def limpar(self, carrinho_id):
+        ItemCarrinho.query.filter_by(carrinho_id=carrinho_id).delete(synchronize_session=False)
+        Carrinho.query.filter_by(id=carrinho_id).delete(synchronize_session=False)
+        db.session.commit()
+
+    def _criar(self, carrinho_id):
+        try:
+            with db.session.begin_nested():
+                carrinho = Carrinho(id=carrinho_id, quantidade_itens=0, total_centavos=0)
+                db.session.add(carrinho)
+            return carrinho
+        except IntegrityError:
+            # Outra requisição da mesma sessão (clique duplo, duas abas) criou
+            # o carrinho primeiro.
+            return db.session.get(Carrinho, carrinho_id)
+
+    def _ajustar(self, carrinho, delta_itens, delta_centavos):
+        carrinho.quantidade_itens = Carrinho.quantidade_itens + delta_itens
+        carrinho.total_centavos = Carrinho.total_centavos + delta_centavos
+
+
+class MemoriaCarrinhoStore(CarrinhoStore):
+    """Backend em memória, usado em testes e benchmarks de processo único."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._carrinhos = {}
+        self._proximo_id = 1
+
+    def itens(self, carrinho_id):
+        with self._lock:
+            carrinho = self._carrinhos.get(carrinho_id)
+            return list(carrinho['itens'].values()) if carrinho else []
+
+    def resumo(self, carrinho_id):
+        with self._lock:
+            carrinho = self._carrinhos.get(carrinho_id)
+            if carrinho is None:
+                return RESUMO_VAZIO
+            return ResumoCarrinho(len(carrinho['itens']), carrinho['total_centavos'])
+
+    def adicionar(self, carrinho_id, produto_id, quantidade, tamanho, material_id, material,
+                  pedra_id, pedra, preco_unitario_centavos):
+        with self._lock:
+            carrinho = self._carrinhos.setdefault(carrinho_id, {'itens': {}, 'total_centavos': 0})
+            item_id = self._proximo_id
+            self._proximo_id += 1
+            linha = LinhaCarrinho(item_id, produto_id, quantidade, tamanho, material_id, material,
+                                  pedra_id, pedra, preco_unitario_centavos)
+            carrinho['itens'][item_id] = linha
+            carrinho['total_centavos'] += linha.subtotal_centavos
+            return item_id, ResumoCarrinho(len(carrinho['itens']), carrinho['total_centavos'])
+
+    def remover(self, carrinho_id, item_id):
+        with self._lock:
+            carrinho = self._carrinhos.get(carrinho_id)
+            if carrinho is None or item_id not in carrinho['itens']:
+                return None
+            linha = carrinho['itens'].pop(item_id)
+            carrinho['total_centavos'] -= linha.subtotal_centavos
+            return ResumoCarrinho(len(carrinho['itens']), carrinho['total_centavos'])
+
+    def atualizar_quantidade(self, carrinho_id, item_id, quantidade):
+        with self._lock:
+            carrinho = self._carrinhos.get(carrinho_id)
+            if carrinho is None or item_id not in carrinho['itens']:
+                return None
+            linha = carrinho['itens'][item_id]
+            nova = linha._replace(quantidade=quantidade)
+            carrinho['itens'][item_id] = nova
+            carrinho['total_centavos'] += nova.subtotal_centavos - linha.subtotal_centavos
+            return ResumoCarrinho(len(carrinho['itens']), carrinho['total_centavos'])
+
+    def limpar(self, carrinho_id):
+        with self._lock:
+            self._carrinhos.pop(carrinho_id, None)
+
+
+BACKENDS = {
+    'sql': SQLCarrinhoStore,
+    'memoria': MemoriaCarrinhoStore,
+}
+
+
+def init_app(app):
+    backend = app.config.get('CARRINHO_BACKEND', 'sql')
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend de carrinho desconhecido: {backend}')
+    app.extensions['carrinho'] = BACKENDS[backend]()
+
+
+def limpar_abandonados(dias):
+    """Apaga os carrinhos SQL sem alteração há mais de `dias` dias."""
+    antigos = select(Carrinho.id).where(Carrinho.updated_at < datetime.utcnow() - timedelta(days=dias))
+    db.session.execute(delete(ItemCarrinho).where(ItemCarrinho.carrinho_id.in_(antigos))
+                       .execution_options(synchronize_session=False))
+    resultado = db.session.execute(delete(Carrinho).where(Carrinho.id.in_(antigos))
+                                   .execution_options(synchronize_session=False))
+    db.session.commit()
+    return resultado.rowcount
+
+
+def store_atual():
+    return current_app.extensions['carrinho']
+
+
+def carrinho_id_da_sessao(criar=False):
+    carrinho_id = session.get('carrinho_id')
+    if carrinho_id is None and criar:
+        carrinho_id = secrets.token_urlsafe(24)
+        session['carrinho_id'] = carrinho_id
+        session.pop('carrinho', None)
+    return carrinho_id
+
+
+def registrar_resumo(resumo):
+    session['carrinho_count'] = resumo.quantidade_itens
+
+
+def _linha(item):
+    return LinhaCarrinho(item.id, item.produto_id, item.quantidade, item.tamanho, item.material_id,
+                         item.material, item.pedra_id, item.pedra, item.preco_unitario_centavos)
@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from models import db, Produto, Material, Pedra, Tamanho
+from precos import centavos
+from conexoes import no_primario
+
+MaterialInfo = namedtuple('MaterialInfo', 'id nome preco_adicional')
+PedraInfo = namedtuple('PedraInfo', 'id nome preco_adicional')
+TamanhoInfo = namedtuple('TamanhoInfo', 'id tamanho')
+ProdutoInfo = namedtuple('ProdutoInfo', 'id nome descricao preco_base imagem_url ativo imagem_variantes')
+
+
+class VersaoCompartilhada:
+    """Carimbo de versão visível para todos os workers.
+
+    O carimbo é um arquivo no diretório de instância: incrementar troca o
+    arquivo atomicamente e ler custa apenas um os.stat, sem ir ao banco.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def atual(self):
+        try:
+            st = os.stat(self.caminho)
+        except FileNotFoundError:
+            return 0
+        return st.st_ino, st.st_mtime_ns
+
+    def incrementar(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        temporario = f'{self.caminho}.{os.getpid()}.{threading.get_ident()}'
+        with open(temporario, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(temporario, self.caminho)
+
+
+class CatalogoCache:
+    """Cache por worker das tabelas de referência do catálogo.
+
+    Materiais, pedras, tamanhos e produtos ficam em memória até expirar o TTL
+    ou até outro worker incrementar a versão do catálogo.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._dados = None
+        self._produtos = {}
+        self._matrizes = {}
+        self._versao = None
+        self._carregado_em = 0.0
+        self.ttl = 300
+        self.versao = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('CATALOGO_CACHE_TTL', 300)
+        caminho = app.config.get('CATALOGO_VERSAO_PATH') or os.path.join(app.instance_path, 'catalogo.versao')
+        self.versao = VersaoCompartilhada(caminho)
+        app.extensions['catalogo'] = self
+
+    def invalidar(self):
+        self.versao.incrementar()
+        with self._lock:
+            self._dados = None
+            self._produtos = {}
+            self._matrizes = {}
+
+    def _garantir(self):
+        versao = self.versao.atual()
+        agora = time.monotonic()
+        dados = self._dados
+        if dados is not None and versao == self._versao and agora - self._carregado_em < self.ttl:
+            return dados
+
+        with self._lock:
+            if self._dados is not None and versao == self._versao and agora - self._carregado_em < self.ttl:
+                return self._dados
+
+            with no_primario():
+                materiais = [MaterialInfo(m.id, m.nome, m.preco_adicional)
+                             for m in Material.query.order_by(Material.id).all()]
+                pedras = [PedraInfo(p.id, p.nome, p.preco_adicional) for p in Pedra.query.order_by(Pedra.id).all()]
+                tamanhos = [TamanhoInfo(t.id, t.tamanho) for t in Tamanho.query.order_by(Tamanho.id).all()]
+
+            self._dados = {
+                'materiais': materiais,
+                'pedras': pedras,
+                'tamanhos': tamanhos,
+                'material_por_id': {m.id: m for m in materiais},
+                'pedra_por_id': {p.id: p for p in pedras},
+            }
+            self._produtos = {}
+            self._matrizes = {}
+            self._versao = versao
+            self._carregado_em = agora
+            return self._dados
+
+    def materiais(self):
+        return self._garantir()['materiais']
+
+    def pedras(self):
+        return self._garantir()['pedras']
+
+    def tamanhos(self):
+        return self._garantir()['tamanhos']
+
+    def material(self, material_id):
+        return self._garantir()['material_por_id'].get(_como_id(material_id))
+
+    def pedra(self, pedra_id):
+        return self._garantir()['pedra_por_id'].get(_como_id(pedra_id))
+
+    def produto(self, produto_id):
+        produto_id = _como_id(produto_id)
+        if produto_id is None:
+            return None
+
+        self._garantir()
+        produtos = self._produtos
+        if produto_id in produtos:
+            return produtos[produto_id]
+
+        with no_primario():
+            produto = db.session.get(Produto, produto_id)
+        if produto is None:
+            # Ids inexistentes não são guardados: percorrer /produto/<n> faria
+            # o dicionário crescer sem limite até o TTL.
+            return None
+        info = ProdutoInfo(produto.id, produto.nome, produto.descricao, produto.preco_base,
+                           produto.imagem_url, produto.ativo, produto.imagem_variantes)
+        produtos[produto_id] = info
+        return info
+
+    def matriz_precos(self, produto_id):
+        """Preço em centavos de cada combinação (material_id, pedra_id) do produto.
+
+        A matriz é montada uma vez por versão do catálogo; alterar preços pelo
+        admin incrementa a versão e força a reconstrução.
+        """
+        produto = self.produto(produto_id)
+        if produto is None:
+            return None
+
+        matrizes = self._matrizes
+        matriz = matrizes.get(produto.id)
+        if matriz is None:
+            dados = self._garantir()
+            base = centavos(produto.preco_base)
+            adicionais_pedra = [(p.id, centavos(p.preco_adicional)) for p in dados['pedras']]
+            matriz = {}
+            for material in dados['materiais']:
+                parcial = base + centavos(material.preco_adicional)
+                for pedra_id, adicional in adicionais_pedra:
+                    matriz[(material.id, pedra_id)] = parcial + adicional
+            matrizes[produto.id] = matriz
+        return matriz
+
+    def preco(self, produto_id, material_id, pedra_id):
+        matriz = self.matriz_precos(produto_id)
+        if matriz is None:
+            return None
+        return matriz.get((_como_id(material_id), _como_id(pedra_id)))
+
+
+def _como_id(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+catalogo = CatalogoCache()
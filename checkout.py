@@ -0,0 +1,99 @@
+from collections import namedtuple
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from models import db, Produto, Pedido, ItemPedido
+from catalogo import catalogo
+from precos import centavos, reais
+from tarefas import enfileirar
+from vendas import registrar_pedido
+
+ResultadoCheckout = namedtuple('ResultadoCheckout', 'pedido criado precos_atualizados')
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def pedido_por_chave(usuario_id, chave_idempotencia):
+    if not chave_idempotencia:
+        return None
+    return Pedido.query.filter_by(chave_idempotencia=chave_idempotencia, usuario_id=usuario_id).first()
+
+
+def finalizar_pedido(usuario_id, itens, metodo_pagamento, chave_idempotencia=None):
+    """Grava o pedido e suas linhas com um número constante de comandos SQL.
+
+    Os preços são revalidados numa única consulta aos produtos (materiais e
+    pedras vêm do cache versionado do catálogo), todo o cálculo é feito em
+    centavos e as linhas entram num único INSERT em lote. Repetir a chamada
+    com a mesma chave de idempotência devolve o pedido já gravado. Os
+    rollups de vendas e a confirmação ao cliente entram na mesma transação.
+    """
+    existente = pedido_por_chave(usuario_id, chave_idempotencia)
+    if existente is not None:
+        return ResultadoCheckout(existente, False, False)
+
+    if not itens:
+        raise CheckoutError('Seu carrinho está vazio.')
+
+    produto_ids = {item.produto_id for item in itens}
+    precos_base = dict(db.session.execute(
+        select(Produto.id, Produto.preco_base).where(Produto.id.in_(produto_ids), Produto.ativo.is_(True))
+    ).all())
+
+    linhas = []
+    vendas = []
+    total_centavos = 0
+    precos_atualizados = False
+    for item in itens:
+        material = catalogo.material(item.material_id)
+        pedra = catalogo.pedra(item.pedra_id)
+        if item.produto_id not in precos_base or material is None or pedra is None:
+            raise CheckoutError('Um dos produtos do carrinho não está mais disponível.')
+
+        preco_unitario = (centavos(precos_base[item.produto_id]) + centavos(material.preco_adicional)
+                          + centavos(pedra.preco_adicional))
+        subtotal = preco_unitario * item.quantidade
+        precos_atualizados = precos_atualizados or preco_unitario != item.preco_unitario_centavos
+        total_centavos += subtotal
+        linhas.append({
+            'produto_id': item.produto_id,
+            'quantidade': item.quantidade,
+            'tamanho': item.tamanho,
+            'material': material.nome,
+            'pedra': pedra.nome,
+            'preco_unitario': reais(preco_unitario),
+            'subtotal': reais(subtotal)
+        })
+        vendas.append({
+            'produto_id': item.produto_id,
+            'material': material.nome,
+            'pedra': pedra.nome,
+            'quantidade': item.quantidade,
+            'subtotal_centavos': subtotal,
+        })
+
+    pedido = Pedido(
+        usuario_id=usuario_id,
+        status='pendente',
+        total=reais(total_centavos),
+        metodo_pagamento=metodo_pagamento,
+        chave_idempotencia=chave_idempotencia
+    )
+    try:
+        db.session.add(pedido)
+        db.session.flush()
+        for linha in linhas:
+            linha['pedido_id'] = pedido.id
+        db.session.execute(insert(ItemPedido), linhas)
+        registrar_pedido(pedido.created_at.date(), vendas)
+        enfileirar('pedido.confirmacao', pedido_id=pedido.id)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        existente = pedido_por_chave(usuario_id, chave_idempotencia)
+        if existente is None:
+            raise
+        return ResultadoCheckout(existente, False, False)
+
+    return ResultadoCheckout(pedido, True, precos_atualizados)
@@ -0,0 +1,138 @@
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+BIND_LEITURA = 'leitura'
+
+
+class SessaoRoteada(Session):
+    """Sessão que envia as leituras das views marcadas com `somente_leitura`
+    para a réplica (bind 'leitura'). Flushes e sessões sem a marca usam o
+    primário; sem réplica configurada tudo vai para o primário."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('leitura') and not self._flushing:
+            replica = self._db.engines.get(BIND_LEITURA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _marcar_escrita(sessao, contexto):
+    sessao.info['escreveu'] = True
+
+
+class Conexoes:
+    """Configuração das engines: pool, pragmas do SQLite e réplica de leitura.
+
+    `init_app` roda antes de `db.init_app`, porque o Flask-SQLAlchemy lê
+    SQLALCHEMY_ENGINE_OPTIONS e SQLALCHEMY_BINDS ao criar as engines, e
+    `configurar_engines` roda depois, já com as engines criadas.
+    """
+
+    _eventos_registrados = False
+
+    def init_app(self, app):
+        config = app.config
+        opcoes = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        opcoes.setdefault('pool_pre_ping', config.get('DB_POOL_PRE_PING', True))
+        opcoes.setdefault('pool_recycle', config.get('DB_POOL_RECYCLE', 1800))
+        url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+        # SQLite em memória usa StaticPool, que não tem tamanho de pool.
+        if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+            opcoes.setdefault('pool_size', config.get('DB_POOL_SIZE', 5))
+            opcoes.setdefault('max_overflow', config.get('DB_MAX_OVERFLOW', 10))
+            opcoes.setdefault('pool_timeout', config.get('DB_POOL_TIMEOUT', 30))
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes
+
+        replica = config.get('DATABASE_REPLICA_URL')
+        if replica:
+            config.setdefault('SQLALCHEMY_BINDS', {})
+            config['SQLALCHEMY_BINDS'].setdefault(BIND_LEITURA, {'url': replica, **opcoes})
+
+        if not Conexoes._eventos_registrados:
+            event.listen(SessaoRoteada, 'after_flush', _marcar_escrita)
+            Conexoes._eventos_registrados = True
+        app.after_request(self._lembrar_escrita)
+        app.extensions['conexoes'] = self
+
+    def configurar_engines(self, app, db):
+        """Aplica os pragmas em cada conexão SQLite nova. O modo WAL só é pedido
+        no primário: mudar o journal exige escrita, e a réplica pode ser
+        somente leitura."""
+        comuns = []
+        # None deixa o padrão do SQLite/driver (usado pelo cenário 'antes' do
+        # benchmark de concorrência).
+        if app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000) is not None:
+            comuns.append(f"PRAGMA busy_timeout={int(app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+        if app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL') is not None:
+            comuns.append(f"PRAGMA synchronous={app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+        primario = (['PRAGMA journal_mode=WAL'] if app.config.get('SQLITE_WAL', True) else []) + comuns
+
+        def ouvinte(pragmas):
+            def aplicar_pragmas(conexao_dbapi, registro):
+                cursor = conexao_dbapi.cursor()
+                try:
+                    for pragma in pragmas:
+                        cursor.execute(pragma)
+                finally:
+                    cursor.close()
+            return aplicar_pragmas
+
+        with app.app_context():
+            for chave, engine in db.engines.items():
+                if engine.dialect.name == 'sqlite':
+                    event.listen(engine, 'connect', ouvinte(comuns if chave == BIND_LEITURA else primario))
+
+    def _lembrar_escrita(self, resposta):
+        # Quem acabou de escrever lê do primário por alguns segundos, para não
+        # ver a réplica atrasada (ex.: o pedido recém-criado sumir de /pedidos).
+        if BIND_LEITURA in current_app.config.get('SQLALCHEMY_BINDS', {}):
+            sessao = current_app.extensions['sqlalchemy'].session
+            if sessao.info.pop('escreveu', False):
+                session['_escrita_em'] = time.time()
+        return resposta
+
+
+def somente_leitura(f):
+    """Marca uma view que só lê do banco: as consultas dela vão para a réplica,
+    exceto logo depois de uma escrita do mesmo usuário."""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if BIND_LEITURA not in current_app.config.get('SQLALCHEMY_BINDS', {}):
+            return f(*args, **kwargs)
+        janela = current_app.config.get('DB_PRIMARIO_APOS_ESCRITA_S', 5)
+        if session.get('_escrita_em', 0) > time.time() - janela:
+            return f(*args, **kwargs)
+        sessao = current_app.extensions['sqlalchemy'].session
+        sessao.info['leitura'] = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            sessao.info.pop('leitura', None)
+    return decorated_function
+
+
+@contextmanager
+def no_primario():
+    """Lê do primário dentro do bloco, mesmo numa view `somente_leitura`.
+
+    Caches indexados por carimbo de versão precisam disso: preenchidos com a
+    réplica atrasada logo depois de uma escrita, guardariam dados antigos sob
+    a versão nova.
+    """
+    sessao = current_app.extensions['sqlalchemy'].session
+    anterior = sessao.info.pop('leitura', None)
+    try:
+        yield
+    finally:
+        if anterior is not None:
+            sessao.info['leitura'] = anterior
+
+
+conexoes = Conexoes()
@@ -5,6 +5,16 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'E2DN39UEB93U12N7H17H7SH'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///lume.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    DB_PRIMARIO_APOS_ESCRITA_S = float(os.environ.get('DB_PRIMARIO_APOS_ESCRITA_S', 5))
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
     
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
@@ -13,4 +23,51 @@ class Config:
     
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = 3600
-
+    
+    RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI')
+    # Usados só pelo armazenamento lume+sqlite (ver limitador.init_app).
+    RATELIMIT_SINCRONIZAR_S = float(os.environ.get('RATELIMIT_SINCRONIZAR_S', 0.5))
+    RATELIMIT_LOTE = int(os.environ.get('RATELIMIT_LOTE', 100))
+    RATELIMIT_STRATEGY = 'sliding-window-counter'
+    RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '200 per day;50 per hour')
+    RATELIMIT_ROTAS = {
+        'login': os.environ.get('RATELIMIT_LOGIN', '5 per minute'),
+    }
+    
+    CATALOGO_CACHE_TTL = int(os.environ.get('CATALOGO_CACHE_TTL', 300))
+    CARRINHO_BACKEND = os.environ.get('CARRINHO_BACKEND', 'sql')
+    CARRINHO_RETENCAO_DIAS = int(os.environ.get('CARRINHO_RETENCAO_DIAS', 30))
+    ITENS_POR_PAGINA = int(os.environ.get('ITENS_POR_PAGINA', 20))
+    BUSCA_BACKEND = os.environ.get('BUSCA_BACKEND', 'auto')
+    
+    CACHE_RESPOSTA_MAX_ITENS = int(os.environ.get('CACHE_RESPOSTA_MAX_ITENS', 512))
+    CACHE_RESPOSTA_MAX_AGE = int(os.environ.get('CACHE_RESPOSTA_MAX_AGE', 0))
+    CACHE_RESPOSTA_DIR = os.environ.get('CACHE_RESPOSTA_DIR')
+    CACHE_RESPOSTA_DISCO_MAX_ITENS = int(os.environ.get('CACHE_RESPOSTA_DISCO_MAX_ITENS', 10000))
+    
+    METRICAS_ATIVAS = os.environ.get('METRICAS_ATIVAS', '1') == '1'
+    METRICAS_LIMIAR_LENTO_MS = float(os.environ.get('METRICAS_LIMIAR_LENTO_MS', 500))
+    
+    USUARIOS_CACHE_MAX_ITENS = int(os.environ.get('USUARIOS_CACHE_MAX_ITENS', 10000))
+    USUARIOS_CACHE_TTL = int(os.environ.get('USUARIOS_CACHE_TTL', 60))
+    
+    SENHA_METODO = os.environ.get('SENHA_METODO', 'scrypt:32768:8:1')
+    SENHA_SALT_LENGTH = int(os.environ.get('SENHA_SALT_LENGTH', 16))
+    SENHA_WORKERS = int(os.environ.get('SENHA_WORKERS', 2))
+    # Menor que as threads do worker (GUNICORN_THREADS), senão a fila nunca enche.
+    SENHA_FILA_MAX = int(os.environ.get('SENHA_FILA_MAX', 4))
+    SENHA_TIMEOUT = float(os.environ.get('SENHA_TIMEOUT', 10))
+    
+    TAREFAS_LOTE = int(os.environ.get('TAREFAS_LOTE', 20))
+    TAREFAS_MAX_TENTATIVAS = int(os.environ.get('TAREFAS_MAX_TENTATIVAS', 5))
+    TAREFAS_BACKOFF_BASE = float(os.environ.get('TAREFAS_BACKOFF_BASE', 5))
+    TAREFAS_BACKOFF_MAX = float(os.environ.get('TAREFAS_BACKOFF_MAX', 3600))
+    TAREFAS_VISIBILIDADE = int(os.environ.get('TAREFAS_VISIBILIDADE', 300))
+    TAREFAS_RETENCAO_DIAS = int(os.environ.get('TAREFAS_RETENCAO_DIAS', 7))
+    
+    ASSETS_TAILWIND_CLI = os.environ.get('TAILWIND_CLI', 'tailwindcss')
+    
+    IMAGENS_DIR = os.environ.get('IMAGENS_DIR')
+    IMAGENS_MAX_BYTES = int(os.environ.get('IMAGENS_MAX_BYTES', 20 * 1024 * 1024))
+    # Hosts dos quais o worker pode baixar imagens de produto cadastradas por URL.
+    IMAGENS_HOSTS_PERMITIDOS = [h for h in os.environ.get('IMAGENS_HOSTS_PERMITIDOS', '').split(',') if h]
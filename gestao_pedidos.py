@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from sqlalchemy import String, cast, literal, select, update
+from models import db, Pedido, ItemPedido, User, STATUS_PEDIDO
+from tarefas import enfileirar_de_consulta
+from vendas import ajustar_por_consulta
+
+LOTE_EXPORTACAO = 1000
+INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+COLUNAS_CSV = [
+    'pedido_id', 'criado_em', 'status', 'metodo_pagamento', 'total', 'cliente_id', 'cliente_nome',
+    'cliente_email', 'item_id', 'produto_id', 'quantidade', 'tamanho', 'material', 'pedra',
+    'preco_unitario', 'subtotal',
+]
+
+
+def filtros_pedidos(status=None, de=None, ate=None):
+    """Condições do filtro do admin; `de` e `ate` são datas inclusivas."""
+    condicoes = []
+    if status in STATUS_PEDIDO:
+        condicoes.append(Pedido.status == status)
+    if de is not None:
+        condicoes.append(Pedido.created_at >= de)
+    if ate is not None:
+        condicoes.append(Pedido.created_at < ate + timedelta(days=1))
+    return condicoes
+
+
+def _linhas(condicoes):
+    """Pedidos com cliente e itens, uma linha por item, lidos em lotes.
+
+    yield_per faz o driver entregar LOTE_EXPORTACAO linhas por vez em vez de
+    carregar o resultado inteiro, então a memória não cresce com o período.
+    """
+    consulta = (
+        select(
+            Pedido.id, Pedido.created_at, Pedido.status, Pedido.metodo_pagamento, Pedido.total,
+            User.id, User.nome, User.email,
+            ItemPedido.id, ItemPedido.produto_id, ItemPedido.quantidade, ItemPedido.tamanho,
+            ItemPedido.material, ItemPedido.pedra, ItemPedido.preco_unitario, ItemPedido.subtotal,
+        )
+        .join(User, User.id == Pedido.usuario_id)
+        .outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .where(*condicoes)
+        .order_by(Pedido.id, ItemPedido.id)
+        .execution_options(yield_per=LOTE_EXPORTACAO)
+    )
+    return db.session.execute(consulta)
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _celula(valor):
+    """Texto da célula do CSV. Campos digitados por clientes que começam como
+    fórmula ganham um apóstrofo, para a planilha não executá-los."""
+    texto = _texto(valor)
+    if isinstance(valor, str) and texto.startswith(INICIO_FORMULA):
+        return "'" + texto
+    return texto
+
+
+def exportar_csv(condicoes):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_CSV)
+    for indice, linha in enumerate(_linhas(condicoes), 1):
+        escritor.writerow([_celula(valor) for valor in linha])
+        if indice % LOTE_EXPORTACAO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def exportar_ndjson(condicoes):
+    """Um objeto JSON por pedido, com os itens aninhados.
+
+    As linhas chegam ordenadas por pedido, então basta acumular os itens do
+    pedido atual e emiti-lo quando o próximo começa.
+    """
+    atual = None
+    pedaco = []
+    for linha in _linhas(condicoes):
+        if atual is None or atual['id'] != linha[0]:
+            if atual is not None:
+                pedaco.append(json.dumps(atual, ensure_ascii=False))
+                if len(pedaco) >= LOTE_EXPORTACAO:
+                    yield '\n'.join(pedaco) + '\n'
+                    pedaco = []
+            atual = {
+                'id': linha[0],
+                'criado_em': _texto(linha[1]),
+                'status': linha[2],
+                'metodo_pagamento': linha[3],
+                'total': _texto(linha[4]),
+                'cliente': {'id': linha[5], 'nome': linha[6], 'email': linha[7]},
+                'itens': [],
+            }
+        if linha[8] is not None:
+            atual['itens'].append({
+                'id': linha[8],
+                'produto_id': linha[9],
+                'quantidade': linha[10],
+                'tamanho': linha[11],
+                'material': linha[12],
+                'pedra': linha[13],
+                'preco_unitario': _texto(linha[14]),
+                'subtotal': _texto(linha[15]),
+            })
+    if atual is not None:
+        pedaco.append(json.dumps(atual, ensure_ascii=False))
+    if pedaco:
+        yield '\n'.join(pedaco) + '\n'
+
+
+def atualizar_status_em_lote(condicoes, novo_status):
+    """Muda o status de todos os pedidos que atendem `condicoes` com um único
+    UPDATE e enfileira os avisos com um único INSERT ... SELECT, na mesma
+    transação, junto com o ajuste dos rollups de vendas para pedidos que entram
+    ou saem de 'cancelado'. Pedidos que já estão em `novo_status` ficam de fora.
+    Devolve a quantidade de pedidos alterados; não faz commit.
+    """
+    if novo_status not in STATUS_PEDIDO:
+        raise ValueError(f'Status inválido: {novo_status}')
+    condicoes = [*condicoes, Pedido.status != novo_status]
+
+    dados = (literal('{"pedido_id": ') + cast(Pedido.id, String) + literal(', "status_anterior": "')
+             + Pedido.status + literal(f'", "status": "{novo_status}"}}'))
+    enfileirar_de_consulta('pedido.status_alterado', dados, *condicoes)
+    if novo_status == 'cancelado':
+        ajustar_por_consulta(condicoes, -1)
+    else:
+        ajustar_por_consulta([*condicoes, Pedido.status == 'cancelado'], 1)
+    resultado = db.session.execute(
+        update(Pedido).where(*condicoes).values(status=novo_status).execution_options(synchronize_session=False)
+    )
+    return resultado.rowcount
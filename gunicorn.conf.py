@@ -0,0 +1,18 @@
+import os
+
+wsgi_app = 'wsgi:app'
+preload_app = True
+# Com threads, um worker atende outras requisições enquanto o hash de senha
+# roda no pool de `senhas`, e a fila limitada dele (SENHA_FILA_MAX) passa a
+# recusar o excesso com 503. Workers sync atenderiam uma requisição por vez.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
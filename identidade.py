@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from catalogo import VersaoCompartilhada
+from conexoes import no_primario
+from models import db, User
+
+Identidade = namedtuple('Identidade', 'id nome is_admin')
+
+
+class UsuarioAtual(UserMixin):
+    """Usuário logado montado a partir da identidade em cache.
+
+    `id`, `nome` e `is_admin` vêm do cache; qualquer outro atributo carrega a
+    linha completa de User na primeira vez em que é acessado.
+    """
+
+    def __init__(self, identidade):
+        self.id = identidade.id
+        self.nome = identidade.nome
+        self.is_admin = identidade.is_admin
+        self._usuario = None
+
+    def __getattr__(self, nome):
+        if nome.startswith('__'):
+            raise AttributeError(nome)
+        usuario = self.__dict__.get('_usuario')
+        if usuario is None:
+            usuario = db.session.get(User, self.__dict__['id'])
+            if usuario is None:
+                raise AttributeError(nome)
+            self._usuario = usuario
+        return getattr(usuario, nome)
+
+
+class IdentidadeCache:
+    """Cache LRU com TTL, por worker, das identidades usadas pelo user_loader.
+
+    Alterar ou excluir um User pelo ORM invalida a entrada depois do commit e
+    incrementa a versão 'usuarios', que esvazia o cache dos demais workers.
+    Updates em massa fora do ORM só são vistos depois do TTL.
+    """
+
+    _eventos_registrados = False
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._itens = OrderedDict()
+        self._versao_vista = None
+        self.max_itens = 10000
+        self.ttl = 60
+        self.versao = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_itens = app.config.get('USUARIOS_CACHE_MAX_ITENS', 10000)
+        self.ttl = app.config.get('USUARIOS_CACHE_TTL', 60)
+        self.versao = VersaoCompartilhada(os.path.join(app.instance_path, 'versoes', 'usuarios'))
+        app.extensions['identidades'] = self
+
+        if not IdentidadeCache._eventos_registrados:
+            event.listen(User, 'after_update', _usuario_alterado)
+            event.listen(User, 'after_delete', _usuario_alterado)
+            event.listen(Session, 'after_commit', _depois_do_commit)
+            event.listen(Session, 'after_rollback', _depois_do_rollback)
+            IdentidadeCache._eventos_registrados = True
+
+    def carregar(self, usuario_id):
+        agora = time.monotonic()
+        versao = self.versao.atual()
+        with self._lock:
+            if versao != self._versao_vista:
+                self._itens.clear()
+                self._versao_vista = versao
+            item = self._itens.get(usuario_id)
+            if item is not None and item[1] > agora:
+                self._itens.move_to_end(usuario_id)
+                return UsuarioAtual(item[0])
+
+        with no_primario():
+            linha = db.session.query(User.id, User.nome, User.is_admin).filter(User.id == usuario_id).first()
+        if linha is None:
+            return None
+        identidade = Identidade(linha.id, linha.nome, bool(linha.is_admin))
+
+        with self._lock:
+            self._itens[usuario_id] = (identidade, agora + self.ttl)
+            self._itens.move_to_end(usuario_id)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+        return UsuarioAtual(identidade)
+
+    def invalidar(self, *usuario_ids):
+        with self._lock:
+            for usuario_id in usuario_ids:
+                self._itens.pop(usuario_id, None)
+        if self.versao is not None:
+            self.versao.incrementar()
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+def _usuario_alterado(mapper, connection, target):
+    sessao = object_session(target)
+    if sessao is not None:
+        sessao.info.setdefault('usuarios_alterados', set()).add(target.id)
+
+
+def _depois_do_commit(sessao):
+    alterados = sessao.info.pop('usuarios_alterados', None)
+    if alterados:
+        identidades.invalidar(*alterados)
+
+
+def _depois_do_rollback(sessao):
+    sessao.info.pop('usuarios_alterados', None)
+
+
+identidades = IdentidadeCache()
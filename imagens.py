@@ -0,0 +1,206 @@
+import hashlib
+import io
+import json
+import os
+import urllib.request
+from collections import namedtuple
+from urllib.parse import urlsplit
+from flask import current_app, url_for
+from sqlalchemy import select, update
+from werkzeug.security import safe_join
+from models import db, Produto
+from catalogo import catalogo
+from assets import assets
+from tarefas import tarefa, enfileirar, apos_commit
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Larguras geradas por perfil (1x e 2x) e o `sizes` de cada um, conforme o
+# layout dos templates que usam o perfil.
+PERFIS = {
+    'miniatura': ((96, 192), '96px'),
+    'card': ((400, 800), '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw'),
+    'detalhe': ((800, 1600), '(min-width: 1024px) 50vw, 100vw'),
+}
+QUALIDADE_WEBP = 80
+QUALIDADE_JPEG = 82
+# Entra no hash do diretório: mudar perfis ou qualidade gera arquivos novos em
+# vez de sobrescrever os que os navegadores já guardaram como imutáveis.
+VERSAO_DERIVADOS = 2
+
+Imagem = namedtuple('Imagem', 'src srcset webp sizes largura altura')
+
+
+def _larguras(pedidas, largura_original):
+    """Larguras efetivas, sem ampliar a imagem além do original."""
+    return sorted({min(largura, largura_original) for largura in pedidas})
+
+
+def diretorio():
+    return current_app.config.get('IMAGENS_DIR') or os.path.join(current_app.instance_path, 'imagens')
+
+
+class _RecusarRedirecionamento(urllib.request.HTTPRedirectHandler):
+    # Um host permitido não pode mandar o worker buscar outro endereço.
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        raise ValueError(f'Redirecionamento recusado ao baixar imagem: {newurl}')
+
+
+_SEM_REDIRECIONAR = urllib.request.build_opener(_RecusarRedirecionamento)
+
+
+def _ler_origem(url):
+    """Conteúdo da imagem original: arquivo em /static ou URL de um dos hosts
+    em IMAGENS_HOSTS_PERMITIDOS, para que o cadastro de um produto não faça o
+    worker acessar endereços internos."""
+    prefixo = f'{current_app.static_url_path}/'
+    limite = current_app.config.get('IMAGENS_MAX_BYTES', 20 * 1024 * 1024)
+    if url.startswith(prefixo):
+        caminho = safe_join(current_app.static_folder, url[len(prefixo):])
+        if caminho is None:
+            raise ValueError(f'Caminho de imagem inválido: {url}')
+        with open(caminho, 'rb') as f:
+            conteudo = f.read(limite + 1)
+    elif url.startswith(('http://', 'https://')):
+        host = urlsplit(url).hostname
+        if host not in current_app.config.get('IMAGENS_HOSTS_PERMITIDOS', ()):
+            raise ValueError(f'Host de imagem fora de IMAGENS_HOSTS_PERMITIDOS: {host}')
+        with _SEM_REDIRECIONAR.open(url, timeout=30) as resposta:
+            conteudo = resposta.read(limite + 1)
+    else:
+        raise ValueError(f'Origem de imagem não suportada: {url}')
+    if len(conteudo) > limite:
+        raise ValueError(f'Imagem maior que IMAGENS_MAX_BYTES: {url}')
+    return conteudo
+
+
+def gerar_derivados(conteudo):
+    """Grava as variantes redimensionadas de `conteudo` num diretório
+    endereçado pelo hash do conteúdo e devolve a descrição delas.
+
+    Imagens iguais (o logo padrão, por exemplo) caem no mesmo diretório e são
+    processadas uma vez só.
+    """
+    chave = hashlib.sha256(conteudo + f':{VERSAO_DERIVADOS}'.encode()).hexdigest()[:24]
+    destino = os.path.join(diretorio(), chave[:2], chave)
+    descricao = os.path.join(destino, 'variantes.json')
+    if os.path.exists(descricao):
+        with open(descricao) as f:
+            return json.load(f)
+
+    imagem = ImageOps.exif_transpose(Image.open(io.BytesIO(conteudo)))
+    transparente = imagem.mode in ('RGBA', 'LA') or (imagem.mode == 'P' and 'transparency' in imagem.info)
+    imagem = imagem.convert('RGBA' if transparente else 'RGB')
+    largura, altura = imagem.size
+    formatos = (['webp'] if features.check('webp') else []) + ['png' if transparente else 'jpg']
+
+    os.makedirs(destino, exist_ok=True)
+    larguras = _larguras([l for pedidas, _ in PERFIS.values() for l in pedidas], largura)
+    for nova_largura in larguras:
+        redimensionada = imagem
+        if nova_largura != largura:
+            redimensionada = imagem.resize((nova_largura, max(1, round(altura * nova_largura / largura))),
+                                           Image.Resampling.LANCZOS)
+        for formato in formatos:
+            caminho = os.path.join(destino, f'{nova_largura}.{formato}')
+            temporario = f'{caminho}.{os.getpid()}'
+            if formato == 'webp':
+                redimensionada.save(temporario, 'WEBP', quality=QUALIDADE_WEBP, method=6)
+            elif formato == 'jpg':
+                redimensionada.save(temporario, 'JPEG', quality=QUALIDADE_JPEG, optimize=True, progressive=True)
+            else:
+                redimensionada.save(temporario, 'PNG', optimize=True)
+            os.replace(temporario, caminho)
+
+    variantes = {'chave': chave, 'larguras': larguras, 'formatos': formatos, 'largura': largura, 'altura': altura}
+    temporario = f'{descricao}.{os.getpid()}'
+    with open(temporario, 'w') as f:
+        json.dump(variantes, f)
+    os.replace(temporario, descricao)
+    return variantes
+
+
+def agendar(produto):
+    """Descarta as variantes atuais do produto e enfileira a geração das novas,
+    na transação que alterou a imagem."""
+    produto.imagem_variantes = None
+    if produto.imagem_url:
+        enfileirar('produto.imagens', produto_id=produto.id, imagem_url=produto.imagem_url)
+
+
+@tarefa('produto.imagens')
+def processar_imagens_produto(produto_id, imagem_url):
+    if Image is None:
+        current_app.logger.warning('Pillow não instalado; produto #%s fica só com a imagem original.', produto_id)
+        return
+    atual = db.session.scalar(select(Produto.imagem_url).where(Produto.id == produto_id))
+    if atual != imagem_url:
+        # O produto foi removido ou a imagem trocou de novo; outra tarefa cuida dela.
+        return
+    variantes = gerar_derivados(_ler_origem(imagem_url))
+    db.session.execute(
+        update(Produto)
+        .where(Produto.id == produto_id, Produto.imagem_url == imagem_url)
+        .values(imagem_variantes=json.dumps(variantes))
+        .execution_options(synchronize_session=False)
+    )
+    apos_commit(catalogo.invalidar)
+
+
+def agendar_pendentes(todos=False, lote=500):
+    """Enfileira a geração de variantes dos produtos que ainda não têm (ou de
+    todos, com `todos=True`), em lotes de `lote` por commit."""
+    condicoes = [Produto.imagem_url.isnot(None), Produto.imagem_url != '']
+    if not todos:
+        condicoes.append(Produto.imagem_variantes.is_(None))
+    ultimo_id = 0
+    total = 0
+    while True:
+        linhas = db.session.execute(
+            select(Produto.id, Produto.imagem_url)
+            .where(*condicoes, Produto.id > ultimo_id)
+            .order_by(Produto.id)
+            .limit(lote)
+        ).all()
+        if not linhas:
+            return total
+        for produto_id, imagem_url in linhas:
+            enfileirar('produto.imagens', produto_id=produto_id, imagem_url=imagem_url)
+        db.session.commit()
+        total += len(linhas)
+        ultimo_id = linhas[-1][0]
+
+
+def imagem_produto(produto, perfil):
+    """Atributos de <img>/<source> do produto no `perfil`; sem variantes
+    geradas, só a imagem original em `src`."""
+    original = assets.versionar(produto.imagem_url or url_for('static', filename='imgs/logo.png'))
+    if not produto.imagem_variantes:
+        return Imagem(original, None, None, None, None, None)
+
+    variantes = json.loads(produto.imagem_variantes)
+    pedidas, sizes = PERFIS[perfil]
+    # Variantes geradas antes de o perfil existir não têm as larguras dele.
+    larguras = [largura for largura in _larguras(pedidas, variantes['largura']) if largura in variantes['larguras']]
+    if not larguras:
+        return Imagem(original, None, None, None, None, None)
+    chave = variantes['chave']
+
+    def srcset(formato):
+        return ', '.join(
+            f"{url_for('loja.imagem_derivada', caminho=f'{chave[:2]}/{chave}/{largura}.{formato}')} {largura}w"
+            for largura in larguras
+        )
+
+    fallback = variantes['formatos'][-1]
+    return Imagem(
+        url_for('loja.imagem_derivada', caminho=f'{chave[:2]}/{chave}/{larguras[0]}.{fallback}'),
+        srcset(fallback),
+        srcset('webp') if 'webp' in variantes['formatos'] else None,
+        sizes,
+        variantes['largura'],
+        variantes['altura'],
+    )
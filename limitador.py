@@ -0,0 +1,266 @@
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from flask import current_app
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+ESQUEMA = 'lume+sqlite'
+LIMPEZA_S = 60
+# Quantas chaves cabem num único "IN (...)" do SQLite sem estourar o limite de
+# parâmetros das versões antigas.
+CHAVES_POR_CONSULTA = 500
+
+
+class ArmazenamentoCompartilhado(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Contadores do Flask-Limiter num arquivo SQLite compartilhado pelos
+    workers (`lume+sqlite:///caminho/limites.db`).
+
+    Cada worker soma os acertos localmente e só vai ao arquivo quando a
+    leitura de uma chave fica mais velha que `intervalo` segundos ou quando
+    `lote` chaves têm incrementos pendentes: a maior parte das verificações custa
+    um acesso a dicionário. Em troca, cada worker pode deixar passar até um
+    intervalo de acertos além do limite. Contadores vencidos saem do arquivo e
+    da memória pela expiração.
+    """
+
+    STORAGE_SCHEME = [ESQUEMA]
+
+    def __init__(self, uri, wrap_exceptions=False, intervalo=0.5, lote=100, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.caminho = uri.split('://', 1)[1]
+        self.intervalo = float(intervalo)
+        self.lote = int(lote)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._conexao = None
+        # chave -> [compartilhado, pendente, sincronizado_em, expira_em]
+        self._locais = {}
+        self._sujas = set()
+        self._ultima_sincronizacao = 0.0
+        self._ultima_limpeza = 0.0
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _abrir(self):
+        # Conexões SQLite não sobrevivem a um fork; cada worker abre a sua e
+        # descarta o que herdou do mestre.
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.caminho) or '.', exist_ok=True)
+            conexao = sqlite3.connect(self.caminho, timeout=1, isolation_level=None, check_same_thread=False)
+            conexao.execute('PRAGMA journal_mode=WAL')
+            conexao.execute('PRAGMA synchronous=OFF')
+            conexao.execute('CREATE TABLE IF NOT EXISTS limites '
+                            '(chave TEXT PRIMARY KEY, valor INTEGER NOT NULL, expira_em REAL NOT NULL) WITHOUT ROWID')
+            conexao.execute('CREATE INDEX IF NOT EXISTS ix_limites_expira_em ON limites (expira_em)')
+            self._conexao = conexao
+            self._locais = {}
+            self._sujas = set()
+            self._pid = os.getpid()
+            threading.Thread(target=self._descarregar_periodicamente, args=(self._pid,), daemon=True,
+                             name='limitador').start()
+        return self._conexao
+
+    def _descarregar_periodicamente(self, pid):
+        # Sem isso, acertos de um worker ocioso ficariam só na memória dele.
+        while self._pid == pid:
+            time.sleep(self.intervalo)
+            with self._lock:
+                if self._sujas and self._pid == pid:
+                    try:
+                        self._sincronizar(time.time())
+                    except sqlite3.Error:
+                        pass
+
+    def _ler(self, chaves, agora):
+        lidos = {}
+        for inicio in range(0, len(chaves), CHAVES_POR_CONSULTA):
+            parte = chaves[inicio:inicio + CHAVES_POR_CONSULTA]
+            lidos.update((c, (valor, expira_em)) for c, valor, expira_em in self._conexao.execute(
+                f"SELECT chave, valor, expira_em FROM limites WHERE chave IN ({','.join('?' * len(parte))}) "
+                'AND expira_em > ?', (*parte, agora)
+            ))
+        return lidos
+
+    def _reler(self, chaves, agora):
+        """Atualiza a parte compartilhada de `chaves` com uma leitura simples;
+        os incrementos pendentes continuam valendo até o próximo lote."""
+        lidos = self._ler(chaves, agora)
+        for c in chaves:
+            valor, expira_em = lidos.get(c, (0, None))
+            local = self._locais.get(c)
+            if local is None:
+                self._locais[c] = [valor, 0, agora, expira_em]
+                continue
+            local[0], local[2] = valor, agora
+            if expira_em is not None or not local[1]:
+                local[3] = expira_em
+
+    def _sincronizar(self, agora):
+        """Grava os incrementos pendentes e relê as chaves gravadas numa única
+        transação. Chamado com o lock adquirido."""
+        conexao = self._abrir()
+        locais = self._locais
+        chaves = [c for c in self._sujas if c in locais]
+        limpar = agora - self._ultima_limpeza >= LIMPEZA_S
+
+        conexao.execute('BEGIN IMMEDIATE')
+        try:
+            conexao.executemany(
+                'INSERT INTO limites (chave, valor, expira_em) VALUES (?1, ?2, ?3) '
+                'ON CONFLICT (chave) DO UPDATE SET '
+                'valor = CASE WHEN limites.expira_em <= ?4 THEN excluded.valor ELSE limites.valor + excluded.valor END, '
+                'expira_em = CASE WHEN limites.expira_em <= ?4 THEN excluded.expira_em ELSE limites.expira_em END',
+                [(c, locais[c][1], locais[c][3], agora) for c in chaves if locais[c][1] and locais[c][3]]
+            )
+            lidos = self._ler(chaves, agora)
+            if limpar:
+                conexao.execute('DELETE FROM limites WHERE expira_em <= ?', (agora,))
+            conexao.execute('COMMIT')
+        except BaseException:
+            conexao.execute('ROLLBACK')
+            raise
+
+        for c in chaves:
+            valor, expira_em = lidos.get(c, (0, None))
+            locais[c] = [valor, 0, agora, expira_em]
+        self._sujas.clear()
+        self._ultima_sincronizacao = agora
+        if limpar:
+            for c in [c for c, local in locais.items() if local[3] is None or local[3] <= agora]:
+                del locais[c]
+            self._ultima_limpeza = agora
+
+    def _garantir(self, chaves, agora):
+        """Entradas locais de `chaves`, relendo numa só consulta as que estão
+        mais velhas que o intervalo. Chamado com o lock adquirido."""
+        self._abrir()
+        velhas = [c for c in chaves if c not in self._locais or agora - self._locais[c][2] >= self.intervalo]
+        if velhas:
+            self._reler(velhas, agora)
+        return [self._locais[c] for c in chaves]
+
+    @staticmethod
+    def _valor(local, agora):
+        if local[3] is None or local[3] <= agora:
+            return 0
+        return local[0] + local[1]
+
+    def incr(self, key, expiry, amount=1):
+        agora = time.time()
+        with self._lock:
+            local, = self._garantir([key], agora)
+            if local[3] is None or local[3] <= agora:
+                local[0], local[3] = 0, agora + expiry
+            local[1] += amount
+            self._sujas.add(key)
+            valor = local[0] + local[1]
+            if len(self._sujas) >= self.lote or agora - self._ultima_sincronizacao >= self.intervalo:
+                self._sincronizar(agora)
+            return valor
+
+    def decr(self, key, amount=1):
+        with self._lock:
+            local = self._locais.get(key)
+            if local is not None:
+                local[1] -= amount
+                self._sujas.add(key)
+
+    def get(self, key):
+        agora = time.time()
+        with self._lock:
+            local, = self._garantir([key], agora)
+            return self._valor(local, agora)
+
+    def get_expiry(self, key):
+        agora = time.time()
+        with self._lock:
+            local, = self._garantir([key], agora)
+            return local[3] if local[3] is not None and local[3] > agora else agora
+
+    def check(self):
+        try:
+            with self._lock:
+                self._abrir().execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._lock:
+            conexao = self._abrir()
+            removidas = conexao.execute('DELETE FROM limites').rowcount
+            self._locais.clear()
+            self._sujas.clear()
+            return removidas
+
+    def clear(self, key):
+        with self._lock:
+            self._abrir().execute('DELETE FROM limites WHERE chave = ?', (key,))
+            self._locais.pop(key, None)
+            self._sujas.discard(key)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+        agora = time.time()
+        anterior, anterior_ttl, atual, _ = self.get_sliding_window(key, expiry)
+        peso_anterior = anterior * anterior_ttl / expiry
+        if floor(peso_anterior + atual) + amount > limit:
+            return False
+        chave_atual = self.sliding_window_keys(key, expiry, agora)[1]
+        contagem = floor(peso_anterior + self.incr(chave_atual, 2 * expiry, amount))
+        if contagem > limit:
+            self.decr(chave_atual, amount)
+            return False
+        if contagem + 1 > limit:
+            # Limite esgotado: grava já, para os outros workers bloquearem na
+            # próxima releitura em vez de esperar o próximo lote.
+            with self._lock:
+                self._sincronizar(time.time())
+        return True
+
+    def get_sliding_window(self, key, expiry):
+        agora = time.time()
+        chave_anterior, chave_atual = self.sliding_window_keys(key, expiry, agora)
+        with self._lock:
+            local_anterior, local_atual = self._garantir([chave_anterior, chave_atual], agora)
+            anterior, atual = self._valor(local_anterior, agora), self._valor(local_atual, agora)
+        atual_ttl = (1 - ((agora / expiry) % 1)) * expiry + expiry
+        return anterior, self._ttl_anterior(expiry, agora, anterior), atual, atual_ttl
+
+    def clear_sliding_window(self, key, expiry):
+        for chave in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(chave)
+
+    @staticmethod
+    def _ttl_anterior(expiry, agora, anterior):
+        return (1 - (((agora - expiry) / expiry) % 1)) * expiry if anterior else 0.0
+
+
+def init_app(app):
+    """Aponta o Flask-Limiter para o armazenamento compartilhado no diretório
+    de instância, a menos que RATELIMIT_STORAGE_URI já indique outro (redis://,
+    memcached://...). Roda antes de `limiter.init_app`.
+
+    `intervalo` e `lote` só são passados ao armazenamento compartilhado: os
+    outros repassam as opções ao cliente (redis.from_url, por exemplo), que
+    recusaria argumentos desconhecidos.
+    """
+    config = app.config
+    if not config.get('RATELIMIT_STORAGE_URI'):
+        config['RATELIMIT_STORAGE_URI'] = f"{ESQUEMA}://{os.path.join(app.instance_path, 'limites.db')}"
+    if config['RATELIMIT_STORAGE_URI'].startswith(f'{ESQUEMA}://'):
+        opcoes = dict(config.get('RATELIMIT_STORAGE_OPTIONS') or {})
+        opcoes.setdefault('intervalo', config.get('RATELIMIT_SINCRONIZAR_S', 0.5))
+        opcoes.setdefault('lote', config.get('RATELIMIT_LOTE', 100))
+        config['RATELIMIT_STORAGE_OPTIONS'] = opcoes
+
+
+def limite_configurado(nome):
+    """Limite de uma rota lido de RATELIMIT_ROTAS a cada requisição."""
+    return lambda: current_app.config['RATELIMIT_ROTAS'][nome]
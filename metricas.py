@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LIMITES_MS = [round(0.1 * 1.25 ** i, 3) for i in range(70)]
+
+
+class Histograma:
+    """Histograma de latência com baldes em escala logarítmica (~25% de erro
+    máximo por percentil), de custo fixo por amostra."""
+
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES_MS) + 1)
+        self.quantidade = 0
+        self.soma_ms = 0.0
+        self.maximo_ms = 0.0
+        self.consultas = 0
+        self.sql_ms = 0.0
+
+    def registrar(self, total_ms, consultas, sql_ms):
+        self.baldes[bisect_left(LIMITES_MS, total_ms)] += 1
+        self.quantidade += 1
+        self.soma_ms += total_ms
+        self.maximo_ms = max(self.maximo_ms, total_ms)
+        self.consultas += consultas
+        self.sql_ms += sql_ms
+
+    def percentil(self, p):
+        if not self.quantidade:
+            return 0.0
+        alvo = p / 100 * self.quantidade
+        acumulado = 0
+        for indice, contagem in enumerate(self.baldes):
+            acumulado += contagem
+            if acumulado >= alvo:
+                return min(LIMITES_MS[indice], self.maximo_ms) if indice < len(LIMITES_MS) else self.maximo_ms
+        return self.maximo_ms
+
+    def resumo(self):
+        quantidade = self.quantidade or 1
+        return {
+            'quantidade': self.quantidade,
+            'media_ms': self.soma_ms / quantidade,
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'p99_ms': self.percentil(99),
+            'maximo_ms': self.maximo_ms,
+            'consultas_media': self.consultas / quantidade,
+            'sql_media_ms': self.sql_ms / quantidade,
+        }
+
+
+class Metricas:
+    """Instrumentação por requisição: SQL, renderização de templates e latência.
+
+    Cada resposta recebe um cabeçalho Server-Timing; requisições acima do
+    limiar vão para o log em JSON e todas alimentam um histograma por endpoint
+    (em memória, por worker).
+    """
+
+    _eventos_registrados = False
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._por_endpoint = {}
+        self.limiar_lento_ms = 500
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.limiar_lento_ms = app.config.get('METRICAS_LIMIAR_LENTO_MS', 500)
+        app.extensions['metricas'] = self
+        if not app.config.get('METRICAS_ATIVAS', True):
+            return
+
+        app.before_request(self._inicio_requisicao)
+        app.after_request(self._fim_requisicao)
+        before_render_template.connect(self._inicio_render, app, weak=False)
+        template_rendered.connect(self._fim_render, app, weak=False)
+
+        if not Metricas._eventos_registrados:
+            event.listen(Engine, 'before_cursor_execute', _inicio_sql)
+            event.listen(Engine, 'after_cursor_execute', _fim_sql)
+            Metricas._eventos_registrados = True
+
+    def _inicio_requisicao(self):
+        g.metricas = {
+            'inicio': time.perf_counter(),
+            'consultas': 0,
+            'sql_ms': 0.0,
+            'mais_lenta_ms': 0.0,
+            'mais_lenta': None,
+            'render_ms': 0.0,
+            'render_inicio': None,
+        }
+
+    def _inicio_render(self, sender, template, context, **extra):
+        dados = g.get('metricas')
+        if dados is not None:
+            dados['render_inicio'] = time.perf_counter()
+
+    def _fim_render(self, sender, template, context, **extra):
+        dados = g.get('metricas')
+        if dados is not None and dados['render_inicio'] is not None:
+            dados['render_ms'] += (time.perf_counter() - dados['render_inicio']) * 1000
+            dados['render_inicio'] = None
+
+    def _fim_requisicao(self, response):
+        dados = g.pop('metricas', None)
+        if dados is None:
+            return response
+
+        total_ms = (time.perf_counter() - dados['inicio']) * 1000
+        response.headers['Server-Timing'] = (
+            f'db;dur={dados["sql_ms"]:.2f};desc="{dados["consultas"]} consultas", '
+            f'tpl;dur={dados["render_ms"]:.2f}, '
+            f'total;dur={total_ms:.2f}'
+        )
+
+        endpoint = request.endpoint or '<sem rota>'
+        with self._lock:
+            histograma = self._por_endpoint.get(endpoint)
+            if histograma is None:
+                histograma = self._por_endpoint[endpoint] = Histograma()
+            histograma.registrar(total_ms, dados['consultas'], dados['sql_ms'])
+
+        if total_ms >= self.limiar_lento_ms:
+            current_app.logger.warning('requisicao_lenta %s', json.dumps({
+                'endpoint': endpoint,
+                'metodo': request.method,
+                'caminho': request.path,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'sql_ms': round(dados['sql_ms'], 2),
+                'consultas': dados['consultas'],
+                'render_ms': round(dados['render_ms'], 2),
+                'consulta_mais_lenta_ms': round(dados['mais_lenta_ms'], 2),
+                'consulta_mais_lenta': (dados['mais_lenta'] or '')[:500],
+            }, ensure_ascii=False))
+
+        return response
+
+    def resumo(self):
+        with self._lock:
+            itens = [(endpoint, histograma.resumo()) for endpoint, histograma in self._por_endpoint.items()]
+        return sorted(itens, key=lambda item: item[1]['p95_ms'], reverse=True)
+
+    def limpar(self):
+        with self._lock:
+            self._por_endpoint = {}
+
+
+def _inicio_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+
+def _fim_sql(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('metricas_inicio')
+    if not inicios:
+        return
+    duracao_ms = (time.perf_counter() - inicios.pop()) * 1000
+    if not has_request_context():
+        return
+    dados = g.get('metricas')
+    if dados is None:
+        return
+    dados['consultas'] += 1
+    dados['sql_ms'] += duracao_ms
+    if duracao_ms > dados['mais_lenta_ms']:
+        dados['mais_lenta_ms'] = duracao_ms
+        dados['mais_lenta'] = statement
+
+
+metricas = Metricas()
@@ -1,9 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload, selectinload
+from senhas import senhas
+from conexoes import SessaoRoteada
 from datetime import datetime
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
+
+STATUS_PEDIDO = ['pendente', 'processando', 'enviado', 'entregue', 'cancelado']
+STATUS_TAREFA = ['pendente', 'processando', 'concluida', 'morta']
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -18,10 +23,10 @@ class User(UserMixin, db.Model):
     favoritos = db.relationship('Favorito', backref='usuario', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.senha_hash = generate_password_hash(password)
+        self.senha_hash = senhas.gerar_hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.senha_hash, password)
+        return senhas.verificar(self.senha_hash, password)
 
 class Produto(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,12 +34,20 @@ class Produto(db.Model):
     descricao = db.Column(db.Text)
     preco_base = db.Column(db.Numeric(10, 2), nullable=False)
     imagem_url = db.Column(db.String(500))
+    imagem_variantes = db.Column(db.Text)
     ativo = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     itens_pedido = db.relationship('ItemPedido', backref='produto', lazy=True)
     avaliacoes = db.relationship('Avaliacao', backref='produto', lazy=True, cascade='all, delete-orphan')
     favoritos = db.relationship('Favorito', backref='produto', lazy=True, cascade='all, delete-orphan')
+    resumo_avaliacoes = db.relationship('ResumoAvaliacao', backref='produto', lazy=True, uselist=False,
+                                        cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_produto_created_at_id', 'created_at', 'id'),
+        db.Index('ix_produto_ativo_created_at_id', 'ativo', 'created_at', 'id'),
+    )
 
 class Material(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -56,13 +69,21 @@ class Pedido(db.Model):
     status = db.Column(db.String(50), default='pendente')
     total = db.Column(db.Numeric(10, 2), nullable=False)
     metodo_pagamento = db.Column(db.String(50))
+    chave_idempotencia = db.Column(db.String(64))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     itens = db.relationship('ItemPedido', backref='pedido', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_pedido_created_at_id', 'created_at', 'id'),
+        db.Index('ix_pedido_usuario_created_at_id', 'usuario_id', 'created_at', 'id'),
+        db.Index('ix_pedido_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('uq_pedido_usuario_chave_idempotencia', 'usuario_id', 'chave_idempotencia', unique=True),
+    )
 
 class ItemPedido(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, index=True)
     produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'), nullable=False)
     quantidade = db.Column(db.Integer, default=1)
     tamanho = db.Column(db.String(10))
@@ -78,6 +99,26 @@ class Avaliacao(db.Model):
     nota = db.Column(db.Integer, nullable=False)
     comentario = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_avaliacao_produto_created_at_id', 'produto_id', 'created_at', 'id'),)
+
+class ResumoAvaliacao(db.Model):
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'), primary_key=True)
+    quantidade = db.Column(db.Integer, default=0, nullable=False)
+    soma = db.Column(db.Integer, default=0, nullable=False)
+    nota_1 = db.Column(db.Integer, default=0, nullable=False)
+    nota_2 = db.Column(db.Integer, default=0, nullable=False)
+    nota_3 = db.Column(db.Integer, default=0, nullable=False)
+    nota_4 = db.Column(db.Integer, default=0, nullable=False)
+    nota_5 = db.Column(db.Integer, default=0, nullable=False)
+    
+    @property
+    def media(self):
+        return self.soma / self.quantidade if self.quantidade else 0
+    
+    @property
+    def histograma(self):
+        return {nota: getattr(self, f'nota_{nota}') for nota in range(5, 0, -1)}
 
 class Favorito(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -87,3 +128,73 @@ class Favorito(db.Model):
     
     __table_args__ = (db.UniqueConstraint('usuario_id', 'produto_id', name='unique_favorito'),)
 
+
+class Carrinho(db.Model):
+    id = db.Column(db.String(64), primary_key=True)
+    quantidade_itens = db.Column(db.Integer, default=0, nullable=False)
+    total_centavos = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    itens = db.relationship('ItemCarrinho', backref='carrinho', lazy=True, cascade='all, delete-orphan')
+
+class ItemCarrinho(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    carrinho_id = db.Column(db.String(64), db.ForeignKey('carrinho.id'), nullable=False, index=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'), nullable=False)
+    quantidade = db.Column(db.Integer, default=1, nullable=False)
+    tamanho = db.Column(db.String(10))
+    material_id = db.Column(db.Integer, db.ForeignKey('material.id'))
+    material = db.Column(db.String(100))
+    pedra_id = db.Column(db.Integer, db.ForeignKey('pedra.id'))
+    pedra = db.Column(db.String(100))
+    preco_unitario_centavos = db.Column(db.Integer, nullable=False)
+
+class Tarefa(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(100), nullable=False)
+    dados = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    disponivel_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    reservada_por = db.Column(db.String(64))
+    reservada_ate = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    concluida_em = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_tarefa_status_disponivel_em_id', 'status', 'disponivel_em', 'id'),
+        db.Index('ix_tarefa_reservada_por', 'reservada_por'),
+    )
+
+class VendaDiaria(db.Model):
+    dia = db.Column(db.Date, primary_key=True)
+    pedidos = db.Column(db.Integer, default=0, nullable=False)
+    unidades = db.Column(db.Integer, default=0, nullable=False)
+    receita_centavos = db.Column(db.BigInteger, default=0, nullable=False)
+
+class VendaDiariaItem(db.Model):
+    dia = db.Column(db.Date, primary_key=True)
+    produto_id = db.Column(db.Integer, primary_key=True)
+    material = db.Column(db.String(100), primary_key=True)
+    pedra = db.Column(db.String(100), primary_key=True)
+    pedidos = db.Column(db.Integer, default=0, nullable=False)
+    unidades = db.Column(db.Integer, default=0, nullable=False)
+    receita_centavos = db.Column(db.BigInteger, default=0, nullable=False)
+
+def pedidos_do_usuario(usuario_id):
+    return (Pedido.query
+            .options(selectinload(Pedido.itens))
+            .filter_by(usuario_id=usuario_id)
+            .order_by(Pedido.created_at.desc()))
+
+def pedidos_com_usuario():
+    return (Pedido.query
+            .options(joinedload(Pedido.usuario))
+            .order_by(Pedido.created_at.desc()))
+
+def pedido_detalhado(pedido_id):
+    return (Pedido.query
+            .options(joinedload(Pedido.usuario), selectinload(Pedido.itens).joinedload(ItemPedido.produto))
+            .filter_by(id=pedido_id))
@@ -0,0 +1,28 @@
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from models import db, Pedido
+from tarefas import tarefa
+
+
+def _pedido(pedido_id):
+    return db.session.scalars(
+        db.select(Pedido).options(joinedload(Pedido.usuario)).where(Pedido.id == pedido_id)
+    ).first()
+
+
+@tarefa('pedido.confirmacao')
+def enviar_confirmacao_pedido(pedido_id):
+    pedido = _pedido(pedido_id)
+    if pedido is None:
+        return
+    current_app.logger.info('Confirmação do pedido #%s (R$ %s) enviada para %s',
+                            pedido.id, pedido.total, pedido.usuario.email)
+
+
+@tarefa('pedido.status_alterado')
+def notificar_status_pedido(pedido_id, status_anterior, status):
+    pedido = _pedido(pedido_id)
+    if pedido is None:
+        return
+    current_app.logger.info('Pedido #%s passou de %s para %s; aviso enviado para %s',
+                            pedido.id, status_anterior, status, pedido.usuario.email)
@@ -0,0 +1,44 @@
+import base64
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+Pagina = namedtuple('Pagina', 'itens proximo_cursor')
+
+
+def codificar_cursor(created_at, id):
+    bruto = f'{created_at.isoformat()}|{id}'.encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        data, id = bruto.rsplit('|', 1)
+        return datetime.fromisoformat(data), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginar(query, coluna_data, coluna_id, cursor=None, limite=20):
+    """Paginação por chave (keyset) em ordem decrescente de (data, id).
+
+    Em vez de OFFSET, cada página continua a partir da última linha da
+    anterior, então o custo por página não cresce com o tamanho da tabela.
+    """
+    query = query.order_by(None).order_by(coluna_data.desc(), coluna_id.desc())
+
+    posicao = decodificar_cursor(cursor)
+    if posicao is not None:
+        data, id = posicao
+        query = query.filter(or_(coluna_data < data, and_(coluna_data == data, coluna_id < id)))
+
+    itens = query.limit(limite + 1).all()
+    proximo_cursor = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        ultimo = itens[-1]
+        proximo_cursor = codificar_cursor(getattr(ultimo, coluna_data.key), getattr(ultimo, coluna_id.key))
+    return Pagina(itens, proximo_cursor)
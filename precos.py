@@ -0,0 +1,17 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def centavos(valor):
+    if valor is None:
+        return 0
+    return int((Decimal(str(valor)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def reais(valor_centavos):
+    return (Decimal(valor_centavos) / 100).quantize(Decimal('0.01'))
+
+
+def formatar_reais(valor_centavos):
+    inteiro, fracao = divmod(abs(valor_centavos), 100)
+    sinal = '-' if valor_centavos < 0 else ''
+    return f'{sinal}R$ {inteiro:,}'.replace(',', '.') + f',{fracao:02d}'
@@ -0,0 +1,93 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class SenhasSobrecarregadas(Exception):
+    """Fila de hashing cheia; a requisição deve ser recusada com 503."""
+
+
+class ServicoSenhas:
+    """Hash de senhas em um pool de threads limitado.
+
+    scrypt e PBKDF2 liberam o GIL, então com workers gthread o hash não trava
+    as demais requisições do processo. Quando há mais de `fila_max` hashes em
+    andamento ou esperando, novas chamadas falham na hora em vez de
+    acumular.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pendentes = 0
+        self._prefixo = None
+        self.metodo = 'scrypt:32768:8:1'
+        self.salt_length = 16
+        self.workers = 2
+        self.fila_max = 4
+        self.timeout = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.metodo = app.config.get('SENHA_METODO', 'scrypt:32768:8:1')
+        self.salt_length = app.config.get('SENHA_SALT_LENGTH', 16)
+        self.workers = app.config.get('SENHA_WORKERS', 2)
+        self.fila_max = app.config.get('SENHA_FILA_MAX', 4)
+        self.timeout = app.config.get('SENHA_TIMEOUT', 10)
+        self._prefixo = None
+        app.extensions['senhas'] = self
+
+    def gerar_hash(self, senha):
+        return self._executar(generate_password_hash, senha, self.metodo, self.salt_length)
+
+    def verificar(self, senha_hash, senha):
+        return self._executar(check_password_hash, senha_hash, senha)
+
+    def precisa_rehash(self, senha_hash):
+        """Indica se o hash foi gerado com parâmetros diferentes dos atuais."""
+        if self._prefixo is None:
+            metodo, salt, _ = self.gerar_hash('').split('$', 2)
+            self._prefixo = (metodo, len(salt))
+        try:
+            metodo, salt, _ = senha_hash.split('$', 2)
+        except ValueError:
+            return True
+        return (metodo, len(salt)) != self._prefixo
+
+    def _executar(self, funcao, *args):
+        with self._lock:
+            executor = self._executor_atual()
+            if self._pendentes >= self.fila_max:
+                raise SenhasSobrecarregadas()
+            self._pendentes += 1
+        try:
+            futuro = executor.submit(funcao, *args)
+        except BaseException:
+            self._liberar()
+            raise
+        # A vaga só é liberada quando o hash termina ou é cancelado: depois de
+        # um timeout ele continua na fila do executor e ainda conta no limite.
+        futuro.add_done_callback(self._liberar)
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise SenhasSobrecarregadas()
+
+    def _liberar(self, futuro=None):
+        with self._lock:
+            self._pendentes -= 1
+
+    def _executor_atual(self):
+        # Threads não sobrevivem ao fork: cada worker cria o seu pool.
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='senhas')
+            self._pid = os.getpid()
+            self._pendentes = 0
+        return self._executor
+
+
+senhas = ServicoSenhas()
@@ -0,0 +1,221 @@
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import DateTime, Integer, String, delete, func, insert, literal, select, update
+from models import db, Tarefa, STATUS_TAREFA
+
+_executores = {}
+
+
+def tarefa(tipo):
+    """Registra a função que executa as tarefas de `tipo`; ela recebe os dados
+    enfileirados como argumentos nomeados e não deve fazer commit."""
+
+    def decorator(f):
+        _executores[tipo] = f
+        return f
+    return decorator
+
+
+def enfileirar(tipo, atraso=0, **dados):
+    """Adiciona a tarefa à sessão atual, sem commit: ela é gravada na mesma
+    transação da escrita que a originou, ou não é gravada."""
+    agora = datetime.utcnow()
+    nova = Tarefa(
+        tipo=tipo,
+        dados=json.dumps(dados),
+        status='pendente',
+        tentativas=0,
+        max_tentativas=current_app.config.get('TAREFAS_MAX_TENTATIVAS', 5),
+        disponivel_em=agora + timedelta(seconds=atraso),
+        created_at=agora
+    )
+    db.session.add(nova)
+    return nova
+
+
+def enfileirar_de_consulta(tipo, dados, *condicoes):
+    """Versão em lote de `enfileirar`: um único INSERT ... SELECT cria uma
+    tarefa para cada linha que atende `condicoes`. `dados` é uma expressão SQL
+    que monta o JSON de cada tarefa."""
+    agora = literal(datetime.utcnow(), DateTime)
+    selecao = select(
+        literal(tipo, String), dados, literal('pendente', String), literal(0, Integer),
+        literal(current_app.config.get('TAREFAS_MAX_TENTATIVAS', 5), Integer), agora, agora
+    ).where(*condicoes)
+    return db.session.execute(insert(Tarefa).from_select(
+        ['tipo', 'dados', 'status', 'tentativas', 'max_tentativas', 'disponivel_em', 'created_at'], selecao
+    )).rowcount
+
+
+def apos_commit(funcao):
+    """Agenda `funcao` para depois do commit da tarefa em execução, para
+    efeitos que não podem ver o estado anterior (como invalidar caches)."""
+    db.session.info.setdefault('tarefas_apos_commit', []).append(funcao)
+
+
+def reservar(trabalhador, limite):
+    """Reserva até `limite` tarefas disponíveis num único UPDATE e as devolve.
+
+    A reserva vale por TAREFAS_VISIBILIDADE segundos; se o worker morrer
+    antes de concluir, `recuperar_expiradas` devolve as tarefas à fila (entrega
+    pelo menos uma vez).
+    """
+    agora = datetime.utcnow()
+    lote = f'{trabalhador}:{uuid.uuid4().hex[:12]}'
+    disponiveis = (select(Tarefa.id)
+                   .where(Tarefa.status == 'pendente', Tarefa.disponivel_em <= agora,
+                          Tarefa.tentativas < Tarefa.max_tentativas)
+                   .order_by(Tarefa.disponivel_em, Tarefa.id)
+                   .limit(limite))
+    db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id.in_(disponiveis), Tarefa.status == 'pendente')
+        .values(status='processando', reservada_por=lote,
+                reservada_ate=agora + timedelta(seconds=current_app.config.get('TAREFAS_VISIBILIDADE', 300)),
+                tentativas=Tarefa.tentativas + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return db.session.scalars(select(Tarefa).where(Tarefa.reservada_por == lote).order_by(Tarefa.id)).all()
+
+
+def recuperar_expiradas():
+    """Devolve à fila as reservas vencidas. As que já gastaram todas as
+    tentativas viram 'morta': uma tarefa que derruba o worker (estouro de
+    memória, por exemplo) nunca chega ao tratamento de erro de `executar`."""
+    agora = datetime.utcnow()
+    expiradas = (Tarefa.status == 'processando', Tarefa.reservada_ate < agora)
+    db.session.execute(
+        update(Tarefa)
+        .where(*expiradas, Tarefa.tentativas >= Tarefa.max_tentativas)
+        .values(status='morta', reservada_por=None, reservada_ate=None,
+                erro='Reserva expirou na última tentativa; o worker provavelmente morreu durante a execução.')
+        .execution_options(synchronize_session=False)
+    )
+    resultado = db.session.execute(
+        update(Tarefa)
+        .where(*expiradas)
+        .values(status='pendente', reservada_por=None, reservada_ate=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def executar(tarefa):
+    """Executa uma tarefa reservada e grava o resultado.
+
+    Em caso de erro a tarefa volta para a fila com espera exponencial; ao
+    esgotar as tentativas fica como 'morta' para inspeção no admin.
+    """
+    tarefa_id, tipo, tentativas, max_tentativas = tarefa.id, tarefa.tipo, tarefa.tentativas, tarefa.max_tentativas
+    try:
+        executor = _executores.get(tipo)
+        if executor is None:
+            raise LookupError(f'Tipo de tarefa desconhecido: {tipo}')
+        executor(**json.loads(tarefa.dados))
+        db.session.execute(
+            update(Tarefa).where(Tarefa.id == tarefa_id)
+            .values(status='concluida', concluida_em=datetime.utcnow(), reservada_por=None,
+                    reservada_ate=None, erro=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        for funcao in db.session.info.pop('tarefas_apos_commit', []):
+            funcao()
+        return True
+    except Exception:
+        db.session.info.pop('tarefas_apos_commit', None)
+        db.session.rollback()
+        erro = traceback.format_exc(limit=5)
+        current_app.logger.warning('Tarefa %s (%s) falhou na tentativa %s/%s', tarefa_id, tipo, tentativas,
+                                   max_tentativas)
+        valores = {'reservada_por': None, 'reservada_ate': None, 'erro': erro}
+        if tentativas >= max_tentativas:
+            valores['status'] = 'morta'
+        else:
+            valores['status'] = 'pendente'
+            valores['disponivel_em'] = datetime.utcnow() + timedelta(seconds=espera(tentativas))
+        db.session.execute(update(Tarefa).where(Tarefa.id == tarefa_id).values(**valores)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        return False
+
+
+def espera(tentativas):
+    base = current_app.config.get('TAREFAS_BACKOFF_BASE', 5)
+    maximo = current_app.config.get('TAREFAS_BACKOFF_MAX', 3600)
+    return min(maximo, base * 2 ** (tentativas - 1)) * random.uniform(0.8, 1.2)
+
+
+def reprocessar(tarefa_id):
+    resultado = db.session.execute(
+        update(Tarefa)
+        .where(Tarefa.id == tarefa_id, Tarefa.status == 'morta')
+        .values(status='pendente', tentativas=0, disponivel_em=datetime.utcnow(), erro=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount > 0
+
+
+def limpar_concluidas():
+    limite = datetime.utcnow() - timedelta(days=current_app.config.get('TAREFAS_RETENCAO_DIAS', 7))
+    resultado = db.session.execute(
+        delete(Tarefa).where(Tarefa.status == 'concluida', Tarefa.concluida_em < limite)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def estatisticas():
+    agora = datetime.utcnow()
+    contagens = dict(db.session.execute(select(Tarefa.status, func.count()).group_by(Tarefa.status)).all())
+    mais_antiga = db.session.scalar(
+        select(func.min(Tarefa.disponivel_em)).where(Tarefa.status == 'pendente', Tarefa.disponivel_em <= agora)
+    )
+    return {
+        'contagens': {status: contagens.get(status, 0) for status in STATUS_TAREFA},
+        'atraso_s': (agora - mais_antiga).total_seconds() if mais_antiga else 0.0,
+    }
+
+
+def trabalhar(lote=None, intervalo=1.0, uma_vez=False):
+    """Laço do `flask worker`: reserva lotes, executa e dorme quando a fila
+    está vazia. SIGTERM/SIGINT terminam o lote atual antes de sair."""
+    lote = lote or current_app.config.get('TAREFAS_LOTE', 20)
+    trabalhador = f'{socket.gethostname()}:{os.getpid()}'
+    parar = threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for sinal in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sinal, lambda *args: parar.set())
+
+    processadas = 0
+    ultima_manutencao = 0.0
+    while not parar.is_set():
+        if time.monotonic() - ultima_manutencao >= 60:
+            recuperar_expiradas()
+            limpar_concluidas()
+            ultima_manutencao = time.monotonic()
+
+        tarefas = reservar(trabalhador, lote)
+        for reservada in tarefas:
+            executar(reservada)
+            processadas += 1
+        db.session.remove()
+
+        if not tarefas:
+            if uma_vez:
+                break
+            parar.wait(intervalo)
+    return processadas
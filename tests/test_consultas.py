@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from banco import criar_tabelas, semear_dados_iniciais
+from config import Config
+from models import db, User, Produto, Pedido, ItemPedido
+
+SENHA = 'senha-de-teste'
+
+
+class ConfigTeste(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
+    SESSION_COOKIE_SECURE = False
+    SENHA_METODO = 'pbkdf2:sha256:1000'
+    ITENS_POR_PAGINA = 100
+
+
+@pytest.fixture
+def app():
+    app = create_app(ConfigTeste)
+    with app.app_context():
+        criar_tabelas()
+        semear_dados_iniciais()
+        cliente = User(nome='Cliente', email='cliente@teste.lume')
+        cliente.set_password(SENHA)
+        admin = User.query.filter_by(email='admin@lume.com').one()
+        admin.set_password(SENHA)
+        db.session.add(cliente)
+        db.session.commit()
+        yield app
+        db.session.remove()
+
+
+def _criar_pedidos(quantidade, itens_por_pedido=2):
+    usuario = User.query.filter_by(email='cliente@teste.lume').one()
+    produto = Produto.query.first()
+    for _ in range(quantidade):
+        pedido = Pedido(usuario_id=usuario.id, total=Decimal('10.00') * itens_por_pedido, status='pendente')
+        db.session.add(pedido)
+        db.session.flush()
+        for _ in range(itens_por_pedido):
+            db.session.add(ItemPedido(pedido_id=pedido.id, produto_id=produto.id, quantidade=1,
+                                      preco_unitario=Decimal('10.00'), subtotal=Decimal('10.00')))
+    db.session.commit()
+    return pedido.id
+
+
+def _entrar(app, email):
+    cliente = app.test_client()
+    resposta = cliente.post('/login', data={'email': email, 'senha': SENHA})
+    assert resposta.status_code == 302
+    return cliente
+
+
+def _consultas(app, cliente, url):
+    """Quantidade de comandos SQL executados por uma requisição. A primeira
+    requisição aquece caches (usuário, catálogo) e consome o flash do login."""
+    assert cliente.get(url).status_code == 200
+    contagem = [0]
+
+    def contar(*args):
+        contagem[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', contar)
+    try:
+        assert cliente.get(url).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', contar)
+    return contagem[0]
+
+
+@pytest.mark.parametrize('email, url, esperadas', [
+    ('cliente@teste.lume', '/pedidos', 2),
+    ('admin@lume.com', '/admin/pedidos', 1),
+])
+def test_listagens_de_pedidos_nao_crescem_com_os_pedidos(app, email, url, esperadas):
+    cliente = _entrar(app, email)
+    _criar_pedidos(5)
+    poucos = _consultas(app, cliente, url)
+    _criar_pedidos(10)
+    muitos = _consultas(app, cliente, url)
+    assert poucos == muitos == esperadas
+
+
+def test_detalhe_do_pedido_nao_cresce_com_os_itens(app):
+    cliente = _entrar(app, 'admin@lume.com')
+    poucos = _consultas(app, cliente, f'/admin/pedido/{_criar_pedidos(1, itens_por_pedido=5)}')
+    muitos = _consultas(app, cliente, f'/admin/pedido/{_criar_pedidos(1, itens_por_pedido=15)}')
+    assert poucos == muitos == 2
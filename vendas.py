@@ -0,0 +1,166 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import Integer, cast, desc, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import db, Pedido, ItemPedido, Produto, VendaDiaria, VendaDiariaItem
+
+METRICAS = ('pedidos', 'unidades', 'receita_centavos')
+
+_INSERTS_COM_UPSERT = {
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+
+def _somar(modelo, chaves, linhas):
+    """Soma as métricas de `linhas` às linhas de `modelo`, criando as que
+    ainda não existem.
+
+    No SQLite e no PostgreSQL é um único INSERT ... ON CONFLICT DO UPDATE em
+    lote; nos demais bancos cada linha tenta um UPDATE e, se não existir, um
+    INSERT com o mesmo fallback de corrida de `registrar_avaliacao`.
+    """
+    if not linhas:
+        return
+    inserir = _INSERTS_COM_UPSERT.get(db.session.get_bind().dialect.name)
+    if inserir is not None:
+        comando = inserir(modelo)
+        comando = comando.on_conflict_do_update(
+            index_elements=list(chaves),
+            set_={metrica: getattr(modelo, metrica) + comando.excluded[metrica] for metrica in METRICAS}
+        )
+        db.session.execute(comando, linhas)
+        return
+
+    for linha in linhas:
+        comando = (update(modelo)
+                   .where(*[getattr(modelo, chave) == linha[chave] for chave in chaves])
+                   .values(**{metrica: getattr(modelo, metrica) + linha[metrica] for metrica in METRICAS}))
+        if db.session.execute(comando).rowcount:
+            continue
+        try:
+            with db.session.begin_nested():
+                db.session.execute(modelo.__table__.insert().values(**linha))
+        except IntegrityError:
+            db.session.execute(comando)
+
+
+def registrar_pedido(dia, linhas, sinal=1):
+    """Aplica um pedido aos rollups de vendas; `sinal=-1` o retira.
+
+    `linhas` são dicts com produto_id, material, pedra, quantidade e
+    subtotal_centavos. Quem chama é responsável pelo commit.
+    """
+    por_chave = defaultdict(lambda: {'pedidos': sinal, 'unidades': 0, 'receita_centavos': 0})
+    for linha in linhas:
+        total = por_chave[(linha['produto_id'], linha['material'] or '', linha['pedra'] or '')]
+        total['unidades'] += sinal * linha['quantidade']
+        total['receita_centavos'] += sinal * linha['subtotal_centavos']
+
+    _somar(VendaDiaria, ['dia'], [{
+        'dia': dia,
+        'pedidos': sinal,
+        'unidades': sum(total['unidades'] for total in por_chave.values()),
+        'receita_centavos': sum(total['receita_centavos'] for total in por_chave.values()),
+    }])
+    _somar(VendaDiariaItem, ['dia', 'produto_id', 'material', 'pedra'], [
+        {'dia': dia, 'produto_id': produto_id, 'material': material, 'pedra': pedra, **total}
+        for (produto_id, material, pedra), total in por_chave.items()
+    ])
+
+
+def _dia(valor):
+    return valor if isinstance(valor, date) else date.fromisoformat(str(valor)[:10])
+
+
+def _agregados(condicoes):
+    """Agrega os pedidos que atendem `condicoes` por dia e por dia/produto/
+    material/pedra, no formato das tabelas de rollup."""
+    dia = func.date(Pedido.created_at)
+    centavos_linha = cast(func.round(ItemPedido.subtotal * 100), Integer)
+
+    por_dia = db.session.execute(
+        select(dia, func.count(func.distinct(Pedido.id)), func.coalesce(func.sum(ItemPedido.quantidade), 0),
+               func.coalesce(func.sum(centavos_linha), 0))
+        .select_from(Pedido)
+        .outerjoin(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .where(*condicoes)
+        .group_by(dia)
+    ).all()
+    por_item = db.session.execute(
+        select(dia, ItemPedido.produto_id, func.coalesce(ItemPedido.material, ''),
+               func.coalesce(ItemPedido.pedra, ''), func.count(func.distinct(Pedido.id)),
+               func.sum(ItemPedido.quantidade), func.sum(centavos_linha))
+        .select_from(Pedido)
+        .join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .where(*condicoes)
+        .group_by(dia, ItemPedido.produto_id, ItemPedido.material, ItemPedido.pedra)
+    ).all()
+
+    dias = [{'dia': _dia(d), 'pedidos': pedidos, 'unidades': unidades, 'receita_centavos': receita}
+            for d, pedidos, unidades, receita in por_dia]
+    itens = [{'dia': _dia(d), 'produto_id': produto_id, 'material': material, 'pedra': pedra,
+              'pedidos': pedidos, 'unidades': unidades, 'receita_centavos': receita}
+             for d, produto_id, material, pedra, pedidos, unidades, receita in por_item]
+    return dias, itens
+
+
+def ajustar_por_consulta(condicoes, sinal):
+    """Aplica (ou retira, com `sinal=-1`) de uma vez todos os pedidos que
+    atendem `condicoes`; usado nas mudanças de status em lote."""
+    dias, itens = _agregados(condicoes)
+    for linhas in (dias, itens):
+        for linha in linhas:
+            for metrica in METRICAS:
+                linha[metrica] *= sinal
+    _somar(VendaDiaria, ['dia'], dias)
+    _somar(VendaDiariaItem, ['dia', 'produto_id', 'material', 'pedra'], itens)
+
+
+def reconstruir_vendas():
+    """Recalcula os rollups a partir de todos os pedidos não cancelados."""
+    dias, itens = _agregados([Pedido.status != 'cancelado'])
+    db.session.execute(VendaDiaria.__table__.delete())
+    db.session.execute(VendaDiariaItem.__table__.delete())
+    if dias:
+        db.session.execute(VendaDiaria.__table__.insert(), dias)
+    if itens:
+        db.session.execute(VendaDiariaItem.__table__.insert(), itens)
+    db.session.commit()
+    return len(dias)
+
+
+def painel(de, ate, limite=10):
+    """Dados do painel de vendas entre `de` e `ate` (inclusive), lidos só dos
+    rollups: o custo depende do período, não do histórico de pedidos."""
+    periodo = [VendaDiaria.dia >= de, VendaDiaria.dia <= ate]
+    periodo_itens = [VendaDiariaItem.dia >= de, VendaDiariaItem.dia <= ate]
+    receita = func.sum(VendaDiariaItem.receita_centavos).label('receita_centavos')
+    unidades = func.sum(VendaDiariaItem.unidades).label('unidades')
+
+    dias = VendaDiaria.query.filter(*periodo).order_by(VendaDiaria.dia).all()
+    combinacoes = db.session.execute(
+        select(VendaDiariaItem.material, VendaDiariaItem.pedra, unidades, receita)
+        .where(*periodo_itens)
+        .group_by(VendaDiariaItem.material, VendaDiariaItem.pedra)
+        .order_by(desc('receita_centavos'))
+        .limit(limite)
+    ).all()
+    produtos = db.session.execute(
+        select(VendaDiariaItem.produto_id, Produto.nome, unidades, receita)
+        .outerjoin(Produto, Produto.id == VendaDiariaItem.produto_id)
+        .where(*periodo_itens)
+        .group_by(VendaDiariaItem.produto_id, Produto.nome)
+        .order_by(desc('receita_centavos'))
+        .limit(limite)
+    ).all()
+
+    return {
+        'dias': dias,
+        'pedidos': sum(dia.pedidos for dia in dias),
+        'unidades': sum(dia.unidades for dia in dias),
+        'receita_centavos': sum(dia.receita_centavos for dia in dias),
+        'combinacoes': combinacoes,
+        'produtos': produtos,
+    }
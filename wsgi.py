@@ -1,5 +1,7 @@
-from app import app
+from app import create_app, aquecer
+
+app = create_app()
+aquecer(app)
 
 if __name__ == "__main__":
     app.run()
-